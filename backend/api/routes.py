@@ -1,26 +1,67 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Dict, List
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import hmac
 import shutil
 import os
 import tempfile
-from datetime import datetime
 
-from pharma_guard.core.vcf_parser import VCFParser
-from pharma_guard.core.cpic_logic import calculate_phenotypes, analyze_risk
-from pharma_guard.core.llm_service import LLMService
+from pharma_guard.core.config import settings
+from pharma_guard.core.vcf_parser import parse_vcf_profile
+from pharma_guard.core.cpic_logic import calculate_phenotypes
+from pharma_guard.core.llm_service import LLMService, llm_flights
+from pharma_guard.core.cohort_stats import CohortAggregator, cohort_aggregator
+from pharma_guard.core.llm_scheduler import llm_scheduler, Priority
+from pharma_guard.core.shared_cache import get_shared_cache, content_key, file_digest
+from pharma_guard.core.single_flight import SingleFlight
+from pharma_guard.core.pipeline import build_responses, parse_drug_list
+from pharma_guard.core.result_store import get_result_store
+from pharma_guard.core.export import EXPORT_FORMATS
+from pharma_guard.core.columnar import COLUMNAR_FORMATS, PYARROW_AVAILABLE, columnar_chunks
+from pharma_guard.core.reanalysis import reanalyze
+from pharma_guard.core.batch import analyze_batch, outcome_line
 
 from pharma_guard.models.schemas import (
     AnalysisResponse, 
-    RiskAssessment, 
-    PharmacogenomicProfile, 
-    ClinicalRecommendation,
-    Phenotype
+    CohortStatsResponse
 )
 
 router = APIRouter()
 
+# Concurrent identical /analyze requests (retries, several users opening the
+# same patient) run the pipeline once and share the result
+analysis_flights = SingleFlight()
+
+def _run_analysis(tmp_path: str, digest: str, drugs: List[str]) -> List[AnalysisResponse]:
+    # 2. Parse VCF (Once, shared across workers by content hash)
+    genotypes, detections, quality_metrics = parse_vcf_profile(tmp_path, get_shared_cache(), digest)
+
+    # 3. Calculate CPIC Phenotypes (Once)
+    phenotypes = calculate_phenotypes(genotypes)
+    llm_service = LLMService()
+
+    # 4-7. Risk Analysis, LLM Explanation, Response per Drug
+    results = list(build_responses(
+        "PATIENT_001", genotypes, phenotypes, detections, quality_metrics, drugs, llm_service
+    ))
+    risk_labels = {r.drug: r.risk_assessment.risk_label for r in results}
+
+    store = get_result_store()
+    if store:
+        for response in results:
+            store.add(response)
+
+    # 8. Update Cohort Statistics
+    cohort_aggregator.record(phenotypes, risk_labels)
+    cache = get_shared_cache()
+    if cache:
+        cohort_aggregator.publish(cache)
+
+    return results
+
+# Plain `def` so FastAPI runs it in the threadpool: LLM admission may block
 @router.post("/analyze", response_model=List[AnalysisResponse])
-async def analyze_genomics(
+def analyze_genomics(
     file: UploadFile = File(...), 
     drug_name: str = Form(...)
 ):
@@ -37,75 +78,15 @@ async def analyze_genomics(
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
     try:
-        # 2. Parse VCF (Once)
-        vcf_parser = VCFParser(tmp_path)
-        genotypes = vcf_parser.parse()
-        detections = vcf_parser.get_detections()
-        
-        # 3. Calculate CPIC Phenotypes (Once)
-        phenotypes = calculate_phenotypes(genotypes)
-        
-        # Parse drug names
-        drugs = [d.strip() for d in drug_name.split(",") if d.strip()]
-        results = []
-
-        llm_service = LLMService() 
-
-        for drug in drugs:
-            # 4. Drug-Gene Risk Analysis
-            risk_label, severity, confidence, gene = analyze_risk(drug, phenotypes)
-            
-            # 5. Prepare Data for LLM Explanation
-            primary_phenotype = phenotypes.get(gene, Phenotype.UNKNOWN)
-            diplotype_list = genotypes.get(gene, ["?", "?"])
-            primary_diplotype = "/".join(diplotype_list)
-            
-            # 6. Generate LLM Explanation
-            explanation = llm_service.generate_explanation(
-                gene=gene,
-                drug=drug,
-                phenotype=primary_phenotype,
-                diplotype=primary_diplotype,
-                risk=risk_label,
-                severity=severity.value
-            )
-            
-            # Generate Clinical Recommendation
-            recommendation_text = llm_service.generate_clinical_recommendation(
-                gene=gene,
-                drug=drug,
-                phenotype=primary_phenotype,
-                diplotype=primary_diplotype,
-                risk=risk_label,
-                severity=severity.value
-            )
-
-            # 7. Construct Response
-            response = AnalysisResponse(
-                patient_id="PATIENT_001",
-                drug=drug,
-                timestamp=datetime.now(),
-                risk_assessment=RiskAssessment(
-                    risk_label=risk_label,
-                    confidence_score=confidence,
-                    severity=severity
-                ),
-                pharmacogenomic_profile=PharmacogenomicProfile(
-                    primary_gene=gene,
-                    diplotype=primary_diplotype,
-                    phenotype=primary_phenotype,
-                    detected_variants=detections
-                ),
-                clinical_recommendation=ClinicalRecommendation(
-                    action=recommendation_text,
-                    cpic_alignment=True
-                ),
-                llm_generated_explanation=explanation,
-                quality_metrics=vcf_parser.quality_metrics
-            )
-            results.append(response)
-        
-        return results
+        # Identical (VCF content, drug set) requests in flight share one run
+        digest = file_digest(tmp_path)
+        drugs = parse_drug_list(drug_name)
+        key = content_key(digest, *sorted({d.upper() for d in drugs}))
+        results = analysis_flights.do(key, lambda: _run_analysis(tmp_path, digest, drugs))
+
+        # A coalesced request may list the same drugs in another order
+        by_drug = {r.drug.upper(): r for r in results}
+        return [by_drug[d.upper()] for d in drugs]
 
     except Exception as e:
         import traceback
@@ -116,3 +97,122 @@ async def analyze_genomics(
         # Cleanup temporary file
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
+
+@router.post("/analyze/batch")
+def analyze_genomics_batch(
+    files: List[UploadFile] = File(..., description="VCFs, or tar / zip archives of VCFs"),
+    drug_name: str = Form(...),
+    patient_id_source: str = Query("filename", pattern="^(filename|sample)$",
+                                   description="Take patient_id from the file name or the VCF's sample ID")
+):
+    """
+    Analyzes a cohort in one request. Archive members are streamed without
+    extraction and analyzed on a worker pool; results come back as NDJSON,
+    one line per patient in input order, as each patient completes.
+    LLM calls run at batch priority so interactive requests keep precedence.
+    """
+    drugs = parse_drug_list(drug_name)
+    if not drugs:
+        raise HTTPException(status_code=400, detail="No drug names given.")
+    llm_service = LLMService(priority=Priority.BATCH)
+
+    # Reads the uploads after the handler returns; FastAPI >= 0.118 keeps
+    # UploadFiles open until the response has been sent (see requirements.txt)
+    def lines():
+        store = get_result_store()
+        cache = get_shared_cache()
+        uploads = ((upload.filename, upload.file) for upload in files)
+        for outcome in analyze_batch(uploads, drugs, llm_service, patient_id_source=patient_id_source):
+            if outcome.error is None:
+                if store:
+                    for response in outcome.results:
+                        store.add(response)
+                cohort_aggregator.record(
+                    outcome.phenotypes, {r.drug: r.risk_assessment.risk_label for r in outcome.results}
+                )
+            yield outcome_line(outcome)
+        if cache:
+            cohort_aggregator.publish(cache)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/cohort/stats", response_model=CohortStatsResponse)
+async def cohort_stats():
+    """
+    Phenotype distribution per gene and risk-label counts per drug across all
+    analyzed patients. Served from running counters (merged across workers).
+    """
+    cache = get_shared_cache()
+    aggregator = CohortAggregator.collect(cache) if cache else cohort_aggregator
+    return CohortStatsResponse(**aggregator.to_dict())
+
+@router.get("/llm/metrics")
+async def llm_metrics():
+    """Queue depth, wait times and rate-limit budget of the shared LLM scheduler."""
+    return {
+        **llm_scheduler.metrics(),
+        "coalesced_calls": llm_flights.metrics()["shared"],
+        "coalesced_analyses": analysis_flights.metrics()["shared"],
+    }
+
+def require_results_token(authorization: Optional[str] = Header(None)):
+    """
+    Bulk endpoints hand out every stored patient result, so they need
+    'Authorization: Bearer <RESULTS_API_TOKEN>' and are off while it is unset.
+    """
+    token = settings.RESULTS_API_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="Bulk result access is disabled (RESULTS_API_TOKEN unset).")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing bearer token.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+@router.get("/export", dependencies=[Depends(require_results_token)])
+def export_results(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|fhir|parquet|arrow)$"),
+    cursor: int = Query(0, ge=0, description="Resume after this export_cursor"),
+    limit: Optional[int] = Query(None, ge=1),
+    table: str = Query("risks", pattern="^(risks|detections)$", description="parquet/arrow: which table")
+):
+    """
+    Streams stored analysis results as NDJSON (one AnalysisResponse per line,
+    with its `export_cursor`), as FHIR Observation/DiagnosticReport NDJSON, or
+    as a columnar Parquet / Arrow IPC stream of the risk or detection table.
+    Rows are read in batches, so memory use does not grow with cohort size.
+    """
+    store = get_result_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Result store is disabled.")
+
+    if export_format in COLUMNAR_FORMATS:
+        if not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Parquet/Arrow export needs pyarrow on the server.")
+        return StreamingResponse(
+            columnar_chunks(store.iter_results(after=cursor, limit=limit), export_format, table),
+            media_type=COLUMNAR_FORMATS[export_format]
+        )
+
+    serialize, media_type = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        serialize(store.iter_results(after=cursor, limit=limit)),
+        media_type=media_type
+    )
+
+@router.post("/reanalyze", dependencies=[Depends(require_results_token)])
+def reanalyze_results(
+    regenerate_text: bool = Query(False, description="Regenerate LLM text for changed results"),
+    cursor: int = Query(0, ge=0, description="Resume after this export_cursor"),
+    limit: int = Query(1000, ge=1, le=10000, description="Stale results scanned per call")
+):
+    """
+    Re-evaluates stored results after CPIC rule changes. Only results whose
+    (gene, diplotype) or (drug, phenotype) rules changed are recomputed, from
+    their stored diplotypes; the report lists every result that changed.
+    Work is bounded per call: repeat with cursor=next_cursor until it is null.
+    """
+    store = get_result_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Result store is disabled.")
+
+    llm_service = LLMService(priority=Priority.BATCH) if regenerate_text else None
+    return reanalyze(store, llm_service, after=cursor, limit=limit)
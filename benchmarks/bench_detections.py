@@ -0,0 +1,112 @@
+"""
+Detection collection benchmark (DetectionTable vs one Detection model per row).
+
+Generates a synthetic STAR-tagged VCF (or, with --raw, untagged caller output
+where 1 record in 1000 sits on a star-allele site), then reports:
+  - parse() + get_detection_table() wall time (best of --repeat)
+  - memory retained by the collected detections (tracemalloc)
+  - the same rows held as per-row Detection models, the previous representation
+  - the one-time to_models() conversion done at the response boundary
+
+Usage: PYTHONPATH=. python benchmarks/bench_detections.py [--records 200000] [--raw]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pharma_guard.core.star_annotation import DEFAULT_TABLE, get_default_index, read_star_table
+from pharma_guard.core.vcf_parser import VCFParser
+from pharma_guard.models.schemas import Detection
+
+
+def write_vcf(path: str, records: int) -> None:
+    variants, _ = read_star_table(DEFAULT_TABLE)
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n")
+        for i in range(records):
+            v = variants[i % len(variants)]
+            rsid = v.rsid or "."
+            f.write(f"{v.chrom}\t{v.pos}\t{rsid}\t{v.ref}\t{v.alt}\t99\tPASS\t"
+                    f"GENE={v.gene};STAR={v.star}\tGT:DP\t0/1:40\n")
+
+
+def write_raw_vcf(path: str, records: int, seed: int = 1) -> None:
+    variants, _ = read_star_table(DEFAULT_TABLE)
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n")
+        for i in range(records):
+            if i % 1000 == 0:
+                v = variants[(i // 1000) % len(variants)]
+                chrom, pos, ref, alt, rsid = v.chrom, v.pos, v.ref, v.alt, v.rsid or "."
+            else:
+                chrom, pos, rsid = f"chr{rng.randint(1, 22)}", rng.randint(1, 100_000_000), "."
+                ref, alt = rng.sample("ACGT", 2)
+            filt = "PASS" if rng.random() < 0.95 else "LowQual"
+            f.write(f"{chrom}\t{pos}\t{rsid}\t{ref}\t{alt}\t{rng.randint(20, 99)}\t{filt}\t"
+                    f"DP={rng.randint(5, 80)}\tGT:DP:GQ\t0/1:{rng.randint(5, 80)}:{rng.randint(1, 99)}\n")
+
+
+def best_of(repeat: int, fn):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def retained(fn) -> float:
+    """MB still allocated by fn()'s result once it returns."""
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VCF detection collection")
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--raw", action="store_true", help="Untagged records, annotated from the star table")
+    args = parser.parse_args()
+
+    get_default_index()  # Load the star table outside the timings
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.vcf")
+        (write_raw_vcf if args.raw else write_vcf)(path, args.records)
+
+        def parse_table():
+            vcf_parser = VCFParser(path)
+            vcf_parser.parse()
+            return vcf_parser.get_detection_table()
+
+        parse_time, table = best_of(args.repeat, parse_table)
+        table_mb = retained(parse_table)
+        models_mb = retained(lambda: [Detection(rsid=r, star_allele=s) for r, s in parse_table()])
+        convert_time, _ = best_of(1, table.to_models)
+
+    print(f"records:                            {args.records}")
+    print(f"detections:                         {len(table)}")
+    print(f"parse + get_detection_table:        {parse_time:.2f}s (best of {args.repeat})")
+    print(f"retained, DetectionTable:           {table_mb:.1f}MB")
+    print(f"retained, per-row Detection models: {models_mb:.1f}MB")
+    print(f"to_models() at response boundary:   {convert_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
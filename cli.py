@@ -5,111 +5,124 @@ import argparse
 import sys
 import os
 import json
-from datetime import datetime
 
 # Ensure backend modules can be imported
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from pharma_guard.core.vcf_parser import VCFParser
-    from pharma_guard.core.cpic_logic import calculate_phenotypes, analyze_risk
     from pharma_guard.core.llm_service import LLMService
-    from pharma_guard.models.schemas import (
-        AnalysisResponse, 
-        RiskAssessment, 
-        PharmacogenomicProfile, 
-        ClinicalRecommendation,
-        Phenotype
-    )
+    from pharma_guard.core.star_annotation import StarAlleleIndex
+    from pharma_guard.core.vcf_parser import VCFParser
+    from pharma_guard.core.cpic_logic import calculate_phenotypes
+    from pharma_guard.core.pipeline import build_responses, parse_drug_list, read_manifest
+    from pharma_guard.core.export import EXPORT_FORMATS, json_array_chunks
+    from pharma_guard.core.llm_scheduler import Priority
+    from pharma_guard.core.sharding import run_shards
+    from pharma_guard.core.columnar import COLUMNAR_FORMATS, columnar_paths, require_pyarrow, write_columnar
 except ImportError as e:
     print(json.dumps({"error": f"Import Error: {e}", "path": sys.path}, indent=2))
     sys.exit(1)
 
+def report_patient_error(cursor, patient_id, error):
+    """Same line a shard worker records; on stderr so every output format stays valid."""
+    print(json.dumps({"export_cursor": cursor, "patient_id": patient_id, "error": str(error)}), file=sys.stderr)
+
+def analyze_patients(patients, drugs, llm_service, annotation_index=None, resume_after=0,
+                     on_error=report_patient_error):
+    """
+    Yields (cursor, AnalysisResponse) for every patient/drug. The cursor is the
+    patient's 1-based position in the input, so --resume-after N skips the
+    first N patients of a manifest. A missing VCF is passed to on_error and
+    skipped rather than aborting the rest of the cohort.
+    """
+    for cursor, (patient_id, vcf_path) in enumerate(patients, start=1):
+        if cursor <= resume_after: continue
+        if not os.path.exists(vcf_path):
+            on_error(cursor, patient_id, FileNotFoundError(f"File not found: {vcf_path}"))
+            continue
+
+        vcf_parser = VCFParser(vcf_path, annotation_index=annotation_index)
+        genotypes = vcf_parser.parse()
+        detections = vcf_parser.get_detection_table()
+        phenotypes = calculate_phenotypes(genotypes)
+
+        for response in build_responses(patient_id, genotypes, phenotypes, detections,
+                                        vcf_parser.quality_metrics, drugs, llm_service):
+            yield cursor, response
+
 def main():
     parser = argparse.ArgumentParser(description="PharmaGuard CLI - Pharmacogenomic Risk Prediction")
-    parser.add_argument("--vcf", required=True, help="Path to VCF file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--vcf", help="Path to VCF file")
+    source.add_argument("--manifest", help="File listing VCFs (one per line, or 'patient_id<TAB>path') for cohort runs")
     parser.add_argument("--drug", required=True, help="Drug name to analyze")
     parser.add_argument("--key", help="Groq API Key (optional, can use env var GROQ_API_KEY)")
+    parser.add_argument("--annotation-table", help="TSV of star-allele defining variants (CHROM POS REF ALT GENE STAR) for unannotated VCFs")
+    parser.add_argument("--format", choices=["json", "ndjson", "fhir", "parquet", "arrow"], default="json",
+                        help="json: one list (default); ndjson/fhir: streamed, one record/resource per line; "
+                             "parquet/arrow: columnar risk + detection tables (needs pyarrow and --output)")
+    parser.add_argument("--output", help="Write results to this file instead of stdout "
+                                         "(parquet/arrow: <output>.risks.<ext> and <output>.detections.<ext>)")
+    parser.add_argument("--resume-after", type=int, default=0,
+                        help="Skip the first N manifest entries (the export_cursor of the last completed patient)")
+    parser.add_argument("--shard-dir", help="With --manifest: run as a shard worker writing to this directory. "
+                                            "Start any number of workers on the same directory; rerun to resume.")
+    parser.add_argument("--shard-size", type=int, help="Manifest entries per shard (default: SHARD_SIZE setting)")
     
     args = parser.parse_args()
+    if args.shard_dir and not args.manifest:
+        parser.error("--shard-dir requires --manifest")
+    if args.format in COLUMNAR_FORMATS and (not args.output or args.shard_dir):
+        parser.error(f"--format {args.format} requires --output and does not apply to --shard-dir")
     
     # 1. Validate File
-    if not os.path.exists(args.vcf):
+    if args.vcf and not os.path.exists(args.vcf):
         print(json.dumps({"error": f"File not found: {args.vcf}"}, indent=2))
         sys.exit(1)
         
     try:
-        # 3. Initialize Services
-        llm_service = LLMService(api_key=args.key)
-        
-        # 4. Parse VCF
-        vcf_parser = VCFParser(args.vcf)
-        genotypes = vcf_parser.parse()
-        detections = vcf_parser.get_detections()
-        
-        # 5. Calculate CPIC Phenotypes
-        phenotypes = calculate_phenotypes(genotypes)
+        # 2. Initialize Services
+        llm_service = LLMService(api_key=args.key, priority=Priority.BATCH if args.shard_dir else Priority.INTERACTIVE)
+        annotation_index = StarAlleleIndex.from_table(args.annotation_table) if args.annotation_table else None
+        drugs = parse_drug_list(args.drug)
+
+        if args.shard_dir:
+            # Shard files are NDJSON (or FHIR NDJSON) so they concatenate in order
+            serialize = EXPORT_FORMATS["fhir" if args.format == "fhir" else "ndjson"][0]
+            report = run_shards(args.shard_dir, args.manifest, drugs, llm_service, shard_size=args.shard_size,
+                                annotation_index=annotation_index, serialize=serialize)
+            print(json.dumps(report, indent=2))
+            return
         
-        # Parse drug names
-        drugs = [d.strip() for d in args.drug.split(",") if d.strip()]
-        results = []
+        # 3. Lazily Analyze Each Patient
+        patients = read_manifest(args.manifest) if args.manifest else [("CLI_USER", args.vcf)]
+        records = (
+            (cursor, response.model_dump())
+            for cursor, response in analyze_patients(patients, drugs, llm_service,
+                                                     annotation_index, args.resume_after)
+        )
 
-        for drug in drugs:
-            # 6. Analyze Risk
-            risk_label, severity, confidence, gene = analyze_risk(drug, phenotypes)
-            
-            # 7. Prepare Data for LLM/Output
-            primary_phenotype = phenotypes.get(gene, Phenotype.UNKNOWN)
-            diplotype_list = genotypes.get(gene, ["?", "?"])
-            primary_diplotype = "/".join(diplotype_list)
-            
-            # 8. Generate Explanation
-            explanation = llm_service.generate_explanation(
-                gene=gene,
-                drug=drug,
-                phenotype=primary_phenotype,
-                diplotype=primary_diplotype,
-                risk=risk_label,
-                severity=severity.value
-            )
-            
-            # Generate Clinical Recommendation
-            recommendation_text = llm_service.generate_clinical_recommendation(
-                gene=gene,
-                drug=drug,
-                phenotype=primary_phenotype,
-                diplotype=primary_diplotype,
-                risk=risk_label,
-                severity=severity.value
-            )
+        # 4. Stream Output (memory stays flat for any cohort size)
+        if args.format in COLUMNAR_FORMATS:
+            require_pyarrow()
+            risks_path, detections_path = columnar_paths(args.output, args.format)
+            counts = write_columnar(records, args.format, risks_path, detections_path)
+            print(json.dumps({"risks": risks_path, "detections": detections_path, "rows": counts}, indent=2))
+            return
 
-            # 9. Construct Response Object
-            response = AnalysisResponse(
-                patient_id="CLI_USER",
-                drug=drug,
-                timestamp=datetime.now(),
-                risk_assessment=RiskAssessment(
-                    risk_label=risk_label,
-                    confidence_score=confidence,
-                    severity=severity
-                ),
-                pharmacogenomic_profile=PharmacogenomicProfile(
-                    primary_gene=gene,
-                    diplotype=primary_diplotype,
-                    phenotype=primary_phenotype,
-                    detected_variants=detections
-                ),
-                clinical_recommendation=ClinicalRecommendation(
-                    action=recommendation_text,
-                    cpic_alignment=True
-                ),
-                llm_generated_explanation=explanation,
-                quality_metrics=vcf_parser.quality_metrics
-            )
-            results.append(response.model_dump())
+        if args.format == "json":
+            chunks = json_array_chunks(record for _, record in records)
+        else:
+            chunks = EXPORT_FORMATS[args.format][0](records)
 
-        # 10. Print JSON list to stdout
-        print(json.dumps(results, indent=2, default=str))
+        out = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+        finally:
+            if args.output:
+                out.close()
         
     except Exception as e:
         import traceback
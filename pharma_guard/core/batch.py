@@ -0,0 +1,161 @@
+import gzip
+import json
+import os
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from pharma_guard.core.config import settings
+from pharma_guard.core.cpic_logic import calculate_phenotypes
+from pharma_guard.core.llm_service import LLMService
+from pharma_guard.core.pipeline import build_responses
+from pharma_guard.core.variants import DetectionTable
+from pharma_guard.core.vcf_parser import VCFParser
+from pharma_guard.models.schemas import AnalysisResponse, Phenotype, QualityMetrics
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+VCF_SUFFIXES = (".vcf", ".vcf.gz")
+
+
+class BatchOutcome(NamedTuple):
+    patient_id: str
+    source: str  # Upload / archive member name
+    phenotypes: Dict[str, Phenotype]
+    results: List[AnalysisResponse]
+    error: Optional[str] = None
+
+
+# 1. Archive Members
+
+def _is_vcf(name: str) -> bool:
+    base = os.path.basename(name)
+    # Skip macOS resource forks (__MACOSX/._x.vcf)
+    return base.lower().endswith(VCF_SUFFIXES) and not base.startswith("._")
+
+def _text_lines(name: str, stream: BinaryIO) -> Iterator[str]:
+    # Decoded line by line: tar stream members are not seekable, which
+    # io.TextIOWrapper requires
+    if name.lower().endswith(".gz"):
+        stream = gzip.GzipFile(fileobj=stream)
+    for line in stream:
+        yield line.decode("utf-8", errors="replace")
+
+def iter_vcf_members(filename: str, fileobj: BinaryIO) -> Iterator[Tuple[str, Iterator[str]]]:
+    """
+    Yields (name, text lines) for every VCF in one upload: a zip, a tar
+    (optionally gz/bz2/xz compressed) or a bare .vcf / .vcf.gz. Tar archives
+    are read in stream mode and zip members through ZipFile.open(), so
+    nothing is extracted to disk. Each line iterator is only valid until the next
+    member is requested.
+    """
+    filename = filename or "upload.vcf"
+    lower = filename.lower()
+    if lower.endswith(".zip") or zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_vcf(info.filename): continue
+                with archive.open(info) as member:
+                    yield info.filename, _text_lines(info.filename, member)
+    elif lower.endswith(TAR_SUFFIXES):
+        fileobj.seek(0)
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for info in archive:
+                if not info.isfile() or not _is_vcf(info.name): continue
+                yield info.name, _text_lines(info.name, archive.extractfile(info))
+    else:
+        fileobj.seek(0)
+        yield filename, _text_lines(filename, fileobj)
+
+
+def patient_id_for(name: str, sample_id: Optional[str], source: str = "filename") -> str:
+    """File name without directories and .vcf/.vcf.gz, or the VCF's first sample ID."""
+    if source == "sample" and sample_id:
+        return sample_id
+    base = os.path.basename(name)
+    for suffix in VCF_SUFFIXES:
+        if base.lower().endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+
+# 2. Batch Pipeline
+
+def _analyze(patient_id: str, source: str, genotypes: Dict[str, List[str]], detections: DetectionTable,
+             quality_metrics: QualityMetrics, drugs: List[str], llm_service: LLMService) -> BatchOutcome:
+    phenotypes = calculate_phenotypes(genotypes)
+    results = list(build_responses(patient_id, genotypes, phenotypes, detections,
+                                   quality_metrics, drugs, llm_service))
+    return BatchOutcome(patient_id, source, phenotypes, results)
+
+def _outcome(pending: Union[BatchOutcome, Tuple[str, str, Future]]) -> BatchOutcome:
+    if isinstance(pending, BatchOutcome):
+        return pending
+    patient_id, source, future = pending
+    try:
+        return future.result()
+    except Exception as e:
+        return BatchOutcome(patient_id, source, {}, [], f"Analysis failed: {e}")
+
+def analyze_batch(uploads: Iterable[Tuple[str, BinaryIO]],
+                  drugs: List[str],
+                  llm_service: LLMService,
+                  workers: Optional[int] = None,
+                  patient_id_source: str = "filename") -> Iterator[BatchOutcome]:
+    """
+    Yields one BatchOutcome per VCF found in `uploads` ((filename, binary
+    file) pairs), in input order.
+
+    Each member is parsed as it streams past (a tar stream cannot be
+    revisited), keeping only the compact profile. Risk analysis and the LLM
+    calls, which dominate wall time, run on a pool of `workers` threads. At
+    most 2 x workers patients are in flight, so memory does not grow with
+    archive size.
+    """
+    workers = workers or settings.BATCH_WORKERS
+    pending: deque = deque()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for filename, fileobj in uploads:
+            members = iter_vcf_members(filename, fileobj)
+            while True:
+                try:
+                    name, text = next(members)
+                except StopIteration:
+                    break
+                except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+                    # Corrupt or truncated archive: report it, keep what was read
+                    pending.append(BatchOutcome(patient_id_for(filename, None), filename, {}, [],
+                                                f"Archive could not be read: {e}"))
+                    break
+
+                parser = VCFParser(name)
+                genotypes = parser.parse_lines(text)
+                patient_id = patient_id_for(name, parser.sample_id, patient_id_source)
+                if not parser.quality_metrics.vcf_parsing_success:
+                    pending.append(BatchOutcome(patient_id, name, {}, [], "VCF could not be parsed"))
+                else:
+                    future = pool.submit(_analyze, patient_id, name, genotypes, parser.get_detection_table(),
+                                         parser.quality_metrics, drugs, llm_service)
+                    pending.append((patient_id, name, future))
+
+                while len(pending) >= 2 * workers:
+                    yield _outcome(pending.popleft())
+
+        while pending:
+            yield _outcome(pending.popleft())
+    finally:
+        # Client went away mid-stream: drop queued patients, finish running ones
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def outcome_line(outcome: BatchOutcome) -> str:
+    """One NDJSON line per patient: its per-drug results, or the error."""
+    line = {"patient_id": outcome.patient_id, "source": outcome.source}
+    if outcome.error is not None:
+        line["error"] = outcome.error
+    else:
+        line["results"] = [r.model_dump(mode="json") for r in outcome.results]
+    return json.dumps(line) + "\n"
@@ -0,0 +1,93 @@
+import os
+import socket
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from pharma_guard.core.shared_cache import SharedCache
+from pharma_guard.models.schemas import Phenotype, RiskLabel
+
+
+class CohortAggregator:
+    """
+    Running phenotype / risk-label counts over every analyzed patient.
+
+    Counters are updated as each analysis completes and two aggregators can be
+    merged by adding their counters, so partial aggregates from separate workers
+    (or batch shards) combine without revisiting any patient. Reads only touch
+    the counters, never the patients behind them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.patients = 0
+        self.phenotypes: Dict[str, Counter] = {}   # gene -> Counter[phenotype]
+        self.risks: Dict[str, Counter] = {}        # drug -> Counter[risk label]
+        self._worker_id: Optional[str] = None
+        self._worker_pid: Optional[int] = None
+
+    def record(self,
+               phenotypes: Dict[str, Phenotype],
+               risks: Optional[Dict[str, RiskLabel]] = None) -> None:
+        """Adds one patient's gene phenotypes and per-drug risk labels."""
+        with self._lock:
+            self.patients += 1
+            for gene, phenotype in phenotypes.items():
+                self.phenotypes.setdefault(gene, Counter())[Phenotype(phenotype).value] += 1
+            for drug, risk in (risks or {}).items():
+                self.risks.setdefault(drug.upper().strip(), Counter())[RiskLabel(risk).value] += 1
+
+    def merge(self, other: "CohortAggregator") -> "CohortAggregator":
+        """Folds another worker's partial aggregate into this one."""
+        snapshot = other.to_dict()
+        with self._lock:
+            self.patients += snapshot["patients_analyzed"]
+            for gene, counts in snapshot["phenotype_distribution"].items():
+                self.phenotypes.setdefault(gene, Counter()).update(counts)
+            for drug, counts in snapshot["risk_distribution"].items():
+                self.risks.setdefault(drug, Counter()).update(counts)
+        return self
+
+    def __add__(self, other: "CohortAggregator") -> "CohortAggregator":
+        return CohortAggregator().merge(self).merge(other)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "patients_analyzed": self.patients,
+                "phenotype_distribution": {g: dict(c) for g, c in self.phenotypes.items()},
+                "risk_distribution": {d: dict(c) for d, c in self.risks.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CohortAggregator":
+        aggregator = cls()
+        aggregator.patients = data.get("patients_analyzed", 0)
+        aggregator.phenotypes = {g: Counter(c) for g, c in data.get("phenotype_distribution", {}).items()}
+        aggregator.risks = {d: Counter(c) for d, c in data.get("risk_distribution", {}).items()}
+        return aggregator
+
+    # Cross-worker sharing: each worker publishes its own partial aggregate
+
+    def _worker_key(self) -> str:
+        # Unique per process lifetime, so a reused pid never overwrites old counts
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._worker_id = f"{socket.gethostname()}-{self._worker_pid}-{uuid.uuid4().hex[:8]}"
+        return self._worker_id
+
+    def publish(self, cache: SharedCache) -> None:
+        cache.set("cohort", self._worker_key(), self.to_dict())
+
+    @classmethod
+    def collect(cls, cache: SharedCache) -> "CohortAggregator":
+        """Merges the partial aggregates published by every worker."""
+        total = cls()
+        for snapshot in cache.values("cohort"):
+            total.merge(cls.from_dict(snapshot))
+        return total
+
+
+# Process-wide aggregate fed by the API
+cohort_aggregator = CohortAggregator()
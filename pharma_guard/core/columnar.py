@@ -0,0 +1,256 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from pharma_guard.core.export import Record, _text
+
+COLUMNAR_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",  # Arrow IPC stream
+}
+TABLES = ("risks", "detections")
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def require_pyarrow() -> None:
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquet/Arrow output needs pyarrow: pip install pyarrow")
+
+
+# 1. Schemas
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    """
+    risks: one row per (patient, drug) result; low-cardinality strings
+           (drug, gene, diplotype, enums) are dictionary-encoded.
+    detections: one row per detected variant, stored once per patient run
+           and joined on risks.detections_cursor = detections.export_cursor.
+    """
+    label = pa.dictionary(pa.int32(), pa.string())
+    return {
+        "risks": pa.schema([
+            ("export_cursor", pa.int64()),
+            ("detections_cursor", pa.int64()),
+            ("patient_id", pa.string()),
+            ("drug", label),
+            ("timestamp", pa.timestamp("us")),
+            ("primary_gene", label),
+            ("diplotype", label),
+            ("diplotype_ambiguous", pa.bool_()),
+            ("phenotype", label),
+            ("risk_label", label),
+            ("severity", label),
+            ("confidence_score", pa.float64()),
+            ("recommendation", pa.string()),
+            ("cpic_alignment", pa.bool_()),
+            ("summary", pa.string()),
+            ("biological_mechanism", pa.string()),
+            ("clinical_implication", pa.string()),
+            ("dosing_rationale", pa.string()),
+            ("vcf_parsing_success", pa.bool_()),
+            ("gene_detected", pa.bool_()),
+            ("total_records", pa.int64()),
+            ("filter_pass", pa.int64()),
+            ("filter_fail", pa.int64()),
+        ]),
+        "detections": pa.schema([
+            ("export_cursor", pa.int64()),
+            ("patient_id", pa.string()),
+            ("rsid", pa.string()),
+            ("star_allele", label),
+        ]),
+    }
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    # model_dump() keeps datetimes, stored JSON payloads hold ISO strings
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+# 2. Writer
+
+class _ByteQueue:
+    """Write-only file object whose bytes are drained as they are produced."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ColumnarWriter:
+    """
+    Writes (cursor, AnalysisResponse dict) records to a risks and/or a
+    detections sink (path or file object; None skips that table) as Parquet
+    or an Arrow IPC stream. Rows are buffered column-wise and flushed every
+    `batch_size` rows as one record batch (one Parquet row group), so memory
+    is bounded by the batch, not the cohort.
+    """
+
+    def __init__(self, fmt: str, risks: Any = None, detections: Any = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        require_pyarrow()
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format: {fmt}")
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.schemas = _schemas()
+        self.sinks = {"risks": risks, "detections": detections}
+        self.writers: Dict[str, Any] = {}
+        self.columns = {name: {f.name: [] for f in schema} for name, schema in self.schemas.items()}
+        self.rows = {name: 0 for name in TABLES}  # Buffered, not yet flushed
+        self.written = {name: 0 for name in TABLES}
+        self._last_patient: Optional[Tuple[str, list]] = None
+        self._detections_cursor = 0
+
+    def _writer(self, table: str):
+        if table not in self.writers:
+            sink, schema = self.sinks[table], self.schemas[table]
+            if self.fmt == "parquet":
+                self.writers[table] = pq.ParquetWriter(sink, schema)
+            else:
+                self.writers[table] = pa.ipc.new_stream(sink, schema)
+        return self.writers[table]
+
+    def _flush(self, table: str) -> None:
+        if not self.rows[table]:
+            return
+        batch = pa.RecordBatch.from_pydict(self.columns[table], schema=self.schemas[table])
+        writer = self._writer(table)
+        if self.fmt == "parquet":
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        for values in self.columns[table].values():
+            values.clear()
+        self.rows[table] = 0
+
+    def _append(self, table: str, row: Dict[str, Any]) -> None:
+        if self.sinks[table] is None:
+            return
+        for name, values in self.columns[table].items():
+            values.append(row[name])
+        self.rows[table] += 1
+        self.written[table] += 1
+        if self.rows[table] >= self.batch_size:
+            self._flush(table)
+
+    def add(self, cursor: int, record: Dict[str, Any]) -> None:
+        profile = record["pharmacogenomic_profile"]
+        risk = record["risk_assessment"]
+        explanation = record["llm_generated_explanation"]
+        qc = record["quality_metrics"]
+        variants = profile["detected_variants"]
+
+        # Per-drug responses of one patient repeat the same detections
+        patient = (record["patient_id"], variants)
+        if patient != self._last_patient:
+            self._last_patient = patient
+            self._detections_cursor = cursor
+            for variant in variants:
+                self._append("detections", {
+                    "export_cursor": cursor,
+                    "patient_id": record["patient_id"],
+                    "rsid": variant["rsid"],
+                    "star_allele": variant["star_allele"],
+                })
+
+        self._append("risks", {
+            "export_cursor": cursor,
+            "detections_cursor": self._detections_cursor,
+            "patient_id": record["patient_id"],
+            "drug": record["drug"],
+            "timestamp": _timestamp(record["timestamp"]),
+            "primary_gene": profile["primary_gene"],
+            "diplotype": profile["diplotype"],
+            "diplotype_ambiguous": profile.get("diplotype_ambiguous", False),
+            "phenotype": _text(profile["phenotype"]),
+            "risk_label": _text(risk["risk_label"]),
+            "severity": _text(risk["severity"]),
+            "confidence_score": risk["confidence_score"],
+            "recommendation": record["clinical_recommendation"]["action"],
+            "cpic_alignment": record["clinical_recommendation"]["cpic_alignment"],
+            "summary": explanation["summary"],
+            "biological_mechanism": explanation["biological_mechanism"],
+            "clinical_implication": explanation["clinical_implication"],
+            "dosing_rationale": explanation["dosing_rationale"],
+            "vcf_parsing_success": qc["vcf_parsing_success"],
+            "gene_detected": qc["gene_detected"],
+            "total_records": qc.get("total_records"),
+            "filter_pass": qc.get("filter_pass"),
+            "filter_fail": qc.get("filter_fail"),
+        })
+
+    def close(self) -> None:
+        """Flushes buffered rows and finalizes every opened table (Parquet footer / IPC EOS)."""
+        for table in TABLES:
+            if self.sinks[table] is None:
+                continue
+            self._flush(table)
+            self._writer(table).close()  # An empty export still gets a valid, empty file
+
+
+def columnar_paths(output: str, fmt: str) -> Tuple[str, str]:
+    """'cohort' or 'cohort.parquet' -> ('cohort.risks.parquet', 'cohort.detections.parquet')"""
+    ext = "parquet" if fmt == "parquet" else "arrows"
+    base = output[:-len(ext) - 1] if output.endswith("." + ext) else output
+    return f"{base}.risks.{ext}", f"{base}.detections.{ext}"
+
+
+def write_columnar(records: Iterable[Record], fmt: str, risks_path: str, detections_path: str,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """Writes both tables to files; returns the row count of each."""
+    writer = ColumnarWriter(fmt, risks_path, detections_path, batch_size)
+    try:
+        for cursor, record in records:
+            writer.add(cursor, record)
+    finally:
+        writer.close()
+    return dict(writer.written)
+
+
+def columnar_chunks(records: Iterable[Record], fmt: str, table: str,
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """One table as a byte stream (for HTTP), yielded after every record batch."""
+    sink = _ByteQueue()
+    writer = ColumnarWriter(fmt, batch_size=batch_size, **{table: sink})
+    for cursor, record in records:
+        writer.add(cursor, record)
+        if sink.chunks:
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
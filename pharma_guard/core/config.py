@@ -9,6 +9,40 @@ class Settings(BaseSettings):
     # Defaulting to a placeholder or env var
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "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")
 
+    # LLM scheduling (see core/llm_scheduler.py)
+    LLM_MAX_CONCURRENT: int = 4
+    LLM_BATCH_RESERVE: float = 0.2  # Fraction of the rate limit kept for interactive requests
+    LLM_INTERACTIVE_MAX_WAIT: float = 30.0
+    LLM_BATCH_MAX_WAIT: float = 5.0
+
+    # Prefork server (see pharma_guard/server.py); 0 = one worker per CPU available
+    # to this container (affinity and cgroup quota), capped at SERVER_MAX_AUTO_WORKERS
+    SERVER_WORKERS: int = 2
+    SERVER_MAX_AUTO_WORKERS: int = 8
+
+    # Cross-worker cache for parsed profiles and LLM answers (see core/shared_cache.py)
+    CACHE_ENABLED: bool = True
+    CACHE_DIR: str = ""  # Private (0700) directory; defaults to ~/.cache/pharma_guard
+    CACHE_PATH: str = ""  # Defaults to <CACHE_DIR>/pharma_guard_cache.sqlite3
+    CACHE_TTL_SECONDS: float = 7 * 24 * 3600  # Not applied to persistent namespaces (cohort stats)
+
+    # Stored results for bulk export (see core/result_store.py)
+    RESULTS_STORE_ENABLED: bool = True
+    RESULTS_PATH: str = ""  # Defaults to <CACHE_DIR>/pharma_guard_results.sqlite3, created 0600
+    RESULTS_RETENTION_SECONDS: float = 90 * 24 * 3600  # Older results are pruned; 0 keeps everything
+    RESULTS_API_TOKEN: str = ""  # Bearer token for /export and /reanalyze; unset disables them
+
+    # Parse-pass QC (see core/qc.py)
+    QC_MIN_DEPTH: int = 20  # Pharmacogene sites below this DP are flagged
+    QC_MAX_FLAGGED_SITES: int = 100
+
+    # /api/analyze/batch (see core/batch.py)
+    BATCH_WORKERS: int = 4  # Patients analyzed concurrently per batch request
+
+    # Sharded cohort runs (see core/sharding.py)
+    SHARD_SIZE: int = 500  # Manifest entries per shard
+    SHARD_LEASE_SECONDS: float = 900.0  # A shard is re-claimable this long after its last heartbeat
+
     class Config:
         case_sensitive = True
 
@@ -1,4 +1,7 @@
-from typing import List, Dict, Tuple
+import hashlib
+import itertools
+import json
+from typing import Any, Iterable, List, Dict, NamedTuple, Optional, Tuple
 from pharma_guard.models.schemas import RiskLabel, Severity, Phenotype
 
 # 1. Allele Activity Scores (CPIC Aligned)
@@ -41,6 +44,19 @@ DPYD_ACTIVITY = {
     "*9A": 0.5
 }
 
+# VKORC1: *2 = rs9923231 (-1639G>A), reduced expression -> higher warfarin sensitivity
+VKORC1_ACTIVITY = {
+    "*1": 1.0,
+    "*2": 0.0
+}
+
+# CYP4F2: *3 = rs2108622 (V433M), reduced vitamin K clearance -> higher warfarin dose.
+# A vitamin K oxidase, so IM/PM here read as decreased / poor function.
+CYP4F2_ACTIVITY = {
+    "*1": 1.0,
+    "*3": 0.0
+}
+
 
 # 2. Phenotype Calculation Logic
 
@@ -108,9 +124,30 @@ def get_phenotype_dpyd(alleles: List[str]) -> Phenotype:
     if score < 1.0: return Phenotype.PM
     return Phenotype.UNKNOWN
 
+def get_phenotype_vkorc1(alleles: List[str]) -> Phenotype:
+    score = calculate_activity_score(alleles, VKORC1_ACTIVITY)
+    # -1639 GG (2.0) -> Normal, GA (1.0) -> Increased, AA (0.0) -> High warfarin sensitivity
+    if score >= 2.0: return Phenotype.NORMAL_SENSITIVITY
+    if 0 < score < 2.0: return Phenotype.INCREASED_SENSITIVITY
+    if score == 0: return Phenotype.HIGH_SENSITIVITY
+    return Phenotype.UNKNOWN
+
+def get_phenotype_cyp4f2(alleles: List[str]) -> Phenotype:
+    score = calculate_activity_score(alleles, CYP4F2_ACTIVITY)
+    if score >= 2.0: return Phenotype.NM
+    if 0 < score < 2.0: return Phenotype.IM
+    if score == 0: return Phenotype.PM
+    return Phenotype.UNKNOWN
+
 
 # 3. Drug-Gene Mapping & Risk Logic
 
+# Single-gene rules name their "GENE" and a phenotype "MAPPING". Multi-gene rules
+# instead list "GENES" (the first is the primary gene) and ordered "RULES" of
+# (phenotype per gene, (risk, severity)); the first matching row wins and
+# ANY matches every phenotype, including Unknown for a gene that wasn't called.
+ANY = None
+
 DRUG_RISK_MAP = {
     "DATA": {
         "CODEINE": {
@@ -133,12 +170,17 @@ DRUG_RISK_MAP = {
             }
         },
         "WARFARIN": {
-            "GENE": "CYP2C9",
-            "MAPPING": {
-                Phenotype.PM: (RiskLabel.TOXIC, Severity.HIGH),
-                Phenotype.IM: (RiskLabel.ADJUST_DOSAGE, Severity.MODERATE),
-                Phenotype.NM: (RiskLabel.SAFE, Severity.NONE)
-            }
+            "GENES": ["CYP2C9", "VKORC1", "CYP4F2"],
+            "RULES": [
+                ((Phenotype.PM, ANY, ANY), (RiskLabel.TOXIC, Severity.HIGH)),
+                ((Phenotype.IM, Phenotype.HIGH_SENSITIVITY, ANY), (RiskLabel.TOXIC, Severity.HIGH)), # Combined high sensitivity
+                ((Phenotype.IM, ANY, ANY), (RiskLabel.ADJUST_DOSAGE, Severity.MODERATE)),
+                ((Phenotype.NM, Phenotype.HIGH_SENSITIVITY, ANY), (RiskLabel.ADJUST_DOSAGE, Severity.MODERATE)),
+                ((Phenotype.NM, Phenotype.INCREASED_SENSITIVITY, ANY), (RiskLabel.ADJUST_DOSAGE, Severity.LOW)),
+                ((Phenotype.NM, ANY, Phenotype.IM), (RiskLabel.ADJUST_DOSAGE, Severity.LOW)), # Dose increase
+                ((Phenotype.NM, ANY, Phenotype.PM), (RiskLabel.ADJUST_DOSAGE, Severity.LOW)),
+                ((Phenotype.NM, ANY, ANY), (RiskLabel.SAFE, Severity.NONE))
+            ]
         },
         "SIMVASTATIN": {
             "GENE": "SLCO1B1",
@@ -167,43 +209,179 @@ DRUG_RISK_MAP = {
     }
 }
 
-def analyze_risk(drug_name: str, phenotypes: Dict[str, Phenotype]) -> Tuple[RiskLabel, Severity, float, str]:
+class RiskCall(NamedTuple):
+    risk_label: RiskLabel
+    severity: Severity
+    confidence: float
+    gene: str  # Primary gene, reported as the response's primary_gene
+
+
+class DrugRule(NamedTuple):
+    genes: Tuple[str, ...]  # Primary gene first
+    table: Dict[Tuple[Phenotype, ...], Tuple[RiskLabel, Severity]]
+
+
+def compile_rule(data: Dict[str, Any]) -> DrugRule:
+    """
+    Expands a DRUG_RISK_MAP entry into a flat table keyed on the combined
+    phenotype tuple, so evaluating it is a single dict lookup.
+    """
+    genes = tuple(data["GENES"]) if "GENES" in data else (data["GENE"],)
+    if "RULES" in data:
+        rows = data["RULES"]
+    else:
+        rows = [((phenotype,), outcome) for phenotype, outcome in data["MAPPING"].items()]
+
+    table: Dict[Tuple[Phenotype, ...], Tuple[RiskLabel, Severity]] = {}
+    for pattern, outcome in rows:
+        choices = [list(Phenotype) if p is ANY else [p] for p in pattern]
+        for key in itertools.product(*choices):
+            table.setdefault(key, outcome)
+    return DrugRule(genes, table)
+
+
+class RuleIndex:
+    """
+    DRUG_RISK_MAP compiled once: a combined-phenotype table per drug plus an
+    inverted gene -> drugs index, so a patient's whole panel is evaluated in
+    one pass over the called genes, touching only the drugs they affect.
+    """
+
+    def __init__(self, drug_map: Dict[str, Dict[str, Any]]):
+        self.rules = {drug: compile_rule(data) for drug, data in drug_map.items()}
+        self.by_gene: Dict[str, List[str]] = {}
+        for drug, rule in self.rules.items():
+            for gene in rule.genes:
+                self.by_gene.setdefault(gene, []).append(drug)
+
+    def call(self, drug: str, phenotypes: Dict[str, Phenotype]) -> RiskCall:
+        rule = self.rules[drug]
+        gene = rule.genes[0]
+        if gene not in phenotypes:
+            # If gene was not tested/found, risk is Unknown
+            return RiskCall(RiskLabel.UNKNOWN, Severity.NONE, 0.0, gene)
+
+        key = tuple(phenotypes.get(g, Phenotype.UNKNOWN) for g in rule.genes)
+        outcome = rule.table.get(key)
+        if outcome is None:
+            return RiskCall(RiskLabel.UNKNOWN, Severity.NONE, 0.4, gene)
+        # A multi-gene rule matched without some of its secondary genes
+        complete = all(g in phenotypes for g in rule.genes)
+        return RiskCall(outcome[0], outcome[1], 0.95 if complete else 0.8, gene)
+
+    def evaluate(self, phenotypes: Dict[str, Phenotype],
+                 drugs: Optional[Iterable[str]] = None) -> Dict[str, RiskCall]:
+        """{DRUG: RiskCall} for every drug (or every requested drug) that involves a called gene."""
+        wanted = None if drugs is None else {d.upper().strip() for d in drugs}
+        calls: Dict[str, RiskCall] = {}
+        for gene in phenotypes:
+            for drug in self.by_gene.get(gene, ()):
+                if drug not in calls and (wanted is None or drug in wanted):
+                    calls[drug] = self.call(drug, phenotypes)
+        return calls
+
+
+RULE_INDEX = RuleIndex(DRUG_RISK_MAP["DATA"])
+
+def evaluate_panel(phenotypes: Dict[str, Phenotype],
+                   drugs: Optional[Iterable[str]] = None) -> Dict[str, RiskCall]:
+    return RULE_INDEX.evaluate(phenotypes, drugs)
+
+def drug_genes(drug_name: str) -> Tuple[str, ...]:
+    """Genes a drug's rule reads, primary first; () for unknown drugs."""
+    rule = RULE_INDEX.rules.get(drug_name.upper().strip())
+    return rule.genes if rule else ()
+
+def analyze_risk(drug_name: str, phenotypes: Dict[str, Phenotype]) -> RiskCall:
     if not drug_name:
-         return RiskLabel.UNKNOWN, Severity.NONE, 0.0, "Unknown"
+         return RiskCall(RiskLabel.UNKNOWN, Severity.NONE, 0.0, "Unknown")
          
     drug_name = drug_name.upper().strip()
-    drug_data = DRUG_RISK_MAP["DATA"].get(drug_name)
-    
-    if not drug_data:
-        return RiskLabel.UNKNOWN, Severity.NONE, 0.5, "Gene Unknown"
-        
-    gene = drug_data["GENE"]
-    phenotype = phenotypes.get(gene, Phenotype.NM) # Default to NM if gene not in VCF (safe assumption? No, strictly report Unknown, but usually panels are targeted. Let's fallback to NM for MVP but flag it.)
-    
-    if gene not in phenotypes:
-        # If gene was not tested/found, risk is Unknown
-        return RiskLabel.UNKNOWN, Severity.NONE, 0.0, gene
+    if drug_name not in RULE_INDEX.rules:
+        return RiskCall(RiskLabel.UNKNOWN, Severity.NONE, 0.5, "Gene Unknown")
 
-    mapping = drug_data["MAPPING"].get(phenotype)
-    
-    if mapping:
-        return mapping[0], mapping[1], 0.95, gene
-        
-    return RiskLabel.UNKNOWN, Severity.NONE, 0.4, gene
+    return RULE_INDEX.call(drug_name, phenotypes)
+
+PHENOTYPE_FUNCTIONS = {
+    "CYP2D6": get_phenotype_cyp2d6,
+    "CYP2C19": get_phenotype_cyp2c19,
+    "CYP2C9": get_phenotype_cyp2c9,
+    "SLCO1B1": get_phenotype_slco1b1,
+    "TPMT": get_phenotype_tpmt,
+    "DPYD": get_phenotype_dpyd,
+    "VKORC1": get_phenotype_vkorc1,
+    "CYP4F2": get_phenotype_cyp4f2,
+}
+
+GENE_ACTIVITY_MAPS = {
+    "CYP2D6": CYP2D6_ACTIVITY,
+    "CYP2C19": CYP2C19_ACTIVITY,
+    "CYP2C9": CYP2C9_ACTIVITY,
+    "SLCO1B1": SLCO1B1_ACTIVITY,
+    "TPMT": TPMT_ACTIVITY,
+    "DPYD": DPYD_ACTIVITY,
+    "VKORC1": VKORC1_ACTIVITY,
+    "CYP4F2": CYP4F2_ACTIVITY,
+}
 
 def calculate_phenotypes(genotypes: Dict[str, List[str]]) -> Dict[str, Phenotype]:
     results = {}
-    if "CYP2D6" in genotypes:
-        results["CYP2D6"] = get_phenotype_cyp2d6(genotypes["CYP2D6"])
-    if "CYP2C19" in genotypes:
-        results["CYP2C19"] = get_phenotype_cyp2c19(genotypes["CYP2C19"])
-    if "CYP2C9" in genotypes:
-        results["CYP2C9"] = get_phenotype_cyp2c9(genotypes["CYP2C9"])
-    if "SLCO1B1" in genotypes:
-        results["SLCO1B1"] = get_phenotype_slco1b1(genotypes["SLCO1B1"])
-    if "TPMT" in genotypes:
-        results["TPMT"] = get_phenotype_tpmt(genotypes["TPMT"])
-    if "DPYD" in genotypes:
-        results["DPYD"] = get_phenotype_dpyd(genotypes["DPYD"])
+    for gene, phenotype_fn in PHENOTYPE_FUNCTIONS.items():
+        if gene in genotypes:
+            results[gene] = phenotype_fn(genotypes[gene])
     
     return results
+
+
+# 4. Rule Set Fingerprint (used to find results affected by rule changes)
+
+# Bump when analyze_risk / RuleIndex.call change in a way the rule data can't
+# show (confidence scores, Unknown handling); every stored result is then recomputed.
+RULES_LOGIC_VERSION = "1"
+
+# Stands in for alleles missing from a gene's activity map, so a changed default score is seen
+UNMAPPED_ALLELE = "*other"
+
+def phenotype_table(gene: str) -> Dict[str, str]:
+    """
+    {diplotype: phenotype} for every pair of the gene's known alleles, i.e. the
+    phenotype function written out as data (thresholds included).
+    """
+    alleles = sorted(GENE_ACTIVITY_MAPS[gene]) + [UNMAPPED_ALLELE]
+    return {
+        f"{a}/{b}": PHENOTYPE_FUNCTIONS[gene]([a, b]).value
+        for a, b in itertools.combinations_with_replacement(alleles, 2)
+    }
+
+def phenotype_key(phenotypes: Iterable[Any]) -> str:
+    """Combined-phenotype key as stored in snapshots: 'PM' or 'PM|IM|NM'."""
+    return "|".join(str(getattr(p, "value", p)) for p in phenotypes)
+
+def rule_snapshot() -> Dict[str, Any]:
+    """
+    JSON-serializable view of the current rules: activity maps, each gene's
+    phenotype_table() (so threshold edits are seen too), RULES_LOGIC_VERSION and
+    drug mappings. Only rule data is hashed, never source text, so comment edits
+    don't invalidate stored results.
+    Mappings are the compiled tables, keyed "PM" for single-gene drugs and
+    "PM|IM|NM" (phenotypes in "genes" order) for multi-gene ones.
+    """
+    return {
+        "activity": {gene: dict(scores) for gene, scores in GENE_ACTIVITY_MAPS.items()},
+        "phenotype_logic": {gene: phenotype_table(gene) for gene in PHENOTYPE_FUNCTIONS},
+        "risk_logic": RULES_LOGIC_VERSION,
+        "drugs": {
+            drug: {
+                "gene": rule.genes[0],
+                "genes": list(rule.genes),
+                "mapping": {phenotype_key(key): [risk.value, severity.value]
+                            for key, (risk, severity) in rule.table.items()},
+            }
+            for drug, rule in RuleIndex(DRUG_RISK_MAP["DATA"]).rules.items()
+        },
+    }
+
+def rules_version(snapshot: Dict[str, Any] = None) -> str:
+    snapshot = snapshot if snapshot is not None else rule_snapshot()
+    canonical = json.dumps(snapshot, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,155 @@
+import weakref
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from pharma_guard.core.star_annotation import StarAlleleIndex, get_default_index
+
+REFERENCE_ALLELE = "*1"
+
+
+def _popcount(mask: int) -> int:
+    # int.bit_count() is 3.10+, the Docker image runs 3.9
+    return bin(mask).count("1")
+
+
+class DiplotypeCall(NamedTuple):
+    alleles: List[str]
+    score: int          # Weighted mismatches (see GeneHaplotypes.call); 0 is a perfect explanation
+    ambiguous: bool     # Another pair explains the observations equally well
+
+
+# 1. Haplotype Definitions as Bitsets
+
+class GeneHaplotypes:
+    """
+    Star-allele definitions for one gene. Each defining variant gets a bit,
+    each star allele is the OR of its variants' bits. All candidate pairs
+    (including the *1 reference) are precomputed once so calling a sample
+    is a flat loop of XOR/AND/popcount over ints.
+    """
+
+    def __init__(self, definitions: Dict[str, Iterable[Hashable]]):
+        self.bits: Dict[Hashable, int] = {}
+        self.masks: Dict[str, int] = {}
+        for star in sorted(definitions):
+            mask = 0
+            for key in definitions[star]:
+                if key not in self.bits:
+                    self.bits[key] = 1 << len(self.bits)
+                mask |= self.bits[key]
+            self.masks[star] = mask
+        self.masks.setdefault(REFERENCE_ALLELE, 0)
+
+        stars = sorted(self.masks)
+        self._pairs: List[Tuple[str, str, int, int]] = []
+        for i, a in enumerate(stars):
+            for b in stars[i:]:
+                ma, mb = self.masks[a], self.masks[b]
+                self._pairs.append((a, b, ma | mb, ma & mb))
+
+    def mask_of(self, keys: Iterable[Hashable]) -> int:
+        mask = 0
+        for key in keys:
+            mask |= self.bits.get(key, 0)
+        return mask
+
+    def call(self, observed: int, homozygous: int = 0) -> DiplotypeCall:
+        """
+        observed: bits of every variant carrying at least one ALT allele.
+        homozygous: subset of observed carried on both haplotypes.
+        Distance = 2 x observed variants the pair doesn't explain
+                   + variants the pair predicts but weren't seen
+                   + observed variants whose zygosity the pair gets wrong.
+        A seen ALT is strong evidence; a defining site missing from a
+        variant-only VCF is weak, so it costs less.
+        """
+        best: Optional[Tuple[str, str]] = None
+        best_score = -1
+        ties = 0
+        for a, b, union, both in self._pairs:
+            score = (2 * _popcount(observed & ~union) + _popcount(union & ~observed)
+                     + _popcount((homozygous ^ both) & observed))
+            if best is None or score < best_score:
+                best, best_score, ties = (a, b), score, 0
+            elif score == best_score:
+                ties += 1
+
+        return DiplotypeCall(alleles=_order(*best), score=best_score, ambiguous=ties > 0)
+
+
+def _order(a: str, b: str) -> List[str]:
+    # Same presentation as before: non-reference alleles first, "*1" last
+    if a == REFERENCE_ALLELE:
+        return [b, a]
+    return [a, b]
+
+
+# 2. Definitions from the Annotation Index
+
+_TABLES: "weakref.WeakKeyDictionary[StarAlleleIndex, Dict[str, GeneHaplotypes]]" = weakref.WeakKeyDictionary()
+
+def get_haplotypes(index: StarAlleleIndex) -> Dict[str, GeneHaplotypes]:
+    """Per-gene tables built once per annotation index and shared by every call."""
+    tables = _TABLES.get(index)
+    if tables is None:
+        tables = {gene: GeneHaplotypes(defs) for gene, defs in index.definitions().items()}
+        _TABLES[index] = tables
+    return tables
+
+
+@lru_cache(maxsize=1024)
+def _frozen_haplotypes(definitions: Tuple[Tuple[str, Tuple[Hashable, ...]], ...]) -> GeneHaplotypes:
+    return GeneHaplotypes(dict(definitions))
+
+def haplotypes_for(definitions: Dict[str, Iterable[Hashable]]) -> GeneHaplotypes:
+    """
+    Table for an ad-hoc definition set, shared by every sample with the same
+    one. Lab-annotated VCFs of one panel all tag the same records, so the
+    pair precompute runs once per panel, not once per sample and gene.
+    """
+    return _frozen_haplotypes(tuple(sorted((star, tuple(sorted(keys))) for star, keys in definitions.items())))
+
+
+# 3. Per-Sample Calling
+
+class VariantObservation(NamedTuple):
+    key: Hashable       # (chrom, pos, ref, alt) for one ALT allele of the record
+    star: str
+    alt_count: int      # Copies of that ALT: 1 = heterozygous, 2 = homozygous
+    tagged: bool        # Star came from the VCF's own STAR= tag
+
+
+def call_diplotype(gene: str,
+                   observations: List[VariantObservation],
+                   index: Optional[StarAlleleIndex] = None) -> DiplotypeCall:
+    """
+    Calls the best-scoring diplotype for one gene.
+
+    Positionally annotated variants are scored against the index's definitions.
+    When the VCF carries its own STAR= tags, those are authoritative: each tagged
+    star is defined by exactly the records tagged with it in this sample.
+    """
+    if not observations:
+        return DiplotypeCall(alleles=[REFERENCE_ALLELE, REFERENCE_ALLELE], score=0, ambiguous=False)
+
+    index = index or get_default_index()
+    builtin = get_haplotypes(index).get(gene)
+    tagged_stars = {o.star for o in observations if o.tagged}
+
+    if builtin is not None and not tagged_stars and all(o.key in builtin.bits for o in observations):
+        table = builtin
+    else:
+        # Sample-specific definitions: tagged records override the index for their star
+        base = index.definitions().get(gene, {}) if builtin is not None else {}
+        definitions: Dict[str, List[Hashable]] = {
+            star: list(keys) for star, keys in base.items() if star not in tagged_stars
+        }
+        for o in observations:
+            keys = definitions.setdefault(o.star, [])
+            if o.key not in keys:
+                keys.append(o.key)
+        table = haplotypes_for(definitions)
+
+    observed = table.mask_of(o.key for o in observations)
+    homozygous = table.mask_of(o.key for o in observations if o.alt_count >= 2)
+    return table.call(observed, homozygous)
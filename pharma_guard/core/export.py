@@ -0,0 +1,106 @@
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+LOINC = "http://loinc.org"
+OBSERVATION_CATEGORY = "http://terminology.hl7.org/CodeSystem/observation-category"
+
+# Records are (cursor, AnalysisResponse-shaped dict) pairs, as yielded by
+# ResultStore.iter_results() or built from AnalysisResponse.model_dump().
+Record = Tuple[int, Dict[str, Any]]
+
+
+def _text(value: Any) -> str:
+    # model_dump() keeps enums, model_dump_json() payloads are plain strings
+    return str(getattr(value, "value", value))
+
+
+# 1. NDJSON
+
+def ndjson_lines(records: Iterable[Record]) -> Iterator[str]:
+    """One AnalysisResponse per line, tagged with the cursor to resume after it."""
+    for cursor, record in records:
+        yield json.dumps({"export_cursor": cursor, **record}, default=str) + "\n"
+
+
+def json_array_chunks(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """The CLI's classic JSON list, emitted element by element."""
+    yield "["
+    first = True
+    for record in records:
+        body = json.dumps(record, indent=2, default=str)
+        yield ("\n" if first else ",\n") + "\n".join("  " + line for line in body.splitlines())
+        first = False
+    yield "\n]\n" if not first else "]\n"
+
+
+# 2. FHIR (R4) Mapping
+
+def _concept(code: str, display: str) -> Dict[str, Any]:
+    return {"coding": [{"system": LOINC, "code": code, "display": display}]}
+
+
+def to_fhir_resources(cursor: int, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Maps one AnalysisResponse to an Observation (gene, diplotype, phenotype,
+    medication) and a DiagnosticReport carrying the risk call and recommendation.
+    Resource ids embed the cursor so a consumer can resume after any line.
+    """
+    profile = record["pharmacogenomic_profile"]
+    risk = record["risk_assessment"]
+    subject = {"reference": f"Patient/{record['patient_id']}"}
+    timestamp = record["timestamp"]
+    effective = timestamp.isoformat() if hasattr(timestamp, "isoformat") else str(timestamp)
+    # FHIR ids: [A-Za-z0-9-.]{1,64}; drug keeps ids unique within one cursor
+    report_id = re.sub(r"[^A-Za-z0-9.-]", "-", f"pharmaguard-{cursor}-{record['drug'].lower()}")[:54]
+    obs_id = f"{report_id}-phenotype"
+
+    observation = {
+        "resourceType": "Observation",
+        "id": obs_id,
+        "status": "final",
+        "category": [{"coding": [{"system": OBSERVATION_CATEGORY, "code": "laboratory"}]}],
+        "code": {**_concept("53040-2", "Genetic variation's effect on drug metabolism"),
+                 "text": f"{profile['primary_gene']} phenotype"},
+        "subject": subject,
+        "effectiveDateTime": effective,
+        "valueCodeableConcept": {"text": _text(profile["phenotype"])},
+        "component": [
+            {"code": _concept("48018-6", "Gene studied [ID]"),
+             "valueCodeableConcept": {"text": profile["primary_gene"]}},
+            {"code": _concept("84413-4", "Genotype display name"),
+             "valueString": profile["diplotype"]},
+            {"code": _concept("51963-7", "Medication assessed [ID]"),
+             "valueCodeableConcept": {"text": record["drug"]}},
+        ],
+    }
+    if profile.get("diplotype_ambiguous"):
+        observation["note"] = [{"text": "Ambiguous diplotype: another star-allele pair fits the observed variants equally well."}]
+
+    report = {
+        "resourceType": "DiagnosticReport",
+        "id": report_id,
+        "status": "final",
+        "code": _concept("51969-4", "Genetic analysis report"),
+        "subject": subject,
+        "effectiveDateTime": effective,
+        "result": [{"reference": f"Observation/{obs_id}"}],
+        "conclusion": (
+            f"{record['drug']}: {_text(risk['risk_label'])} (severity {_text(risk['severity'])}). "
+            f"{record['clinical_recommendation']['action']}"
+        ),
+    }
+    return [observation, report]
+
+
+def fhir_ndjson_lines(records: Iterable[Record]) -> Iterator[str]:
+    """FHIR Bulk Data style NDJSON: one resource per line."""
+    for cursor, record in records:
+        for resource in to_fhir_resources(cursor, record):
+            yield json.dumps(resource, default=str) + "\n"
+
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "fhir": (fhir_ndjson_lines, "application/fhir+ndjson"),
+}
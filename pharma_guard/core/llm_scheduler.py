@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from pharma_guard.core.config import settings
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # Single-patient /api/analyze and CLI requests
+    BATCH = 1        # Cohort jobs; deferred or shed first
+
+
+class LLMOverloaded(Exception):
+    """Raised when queued LLM work cannot be admitted within its wait limit."""
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Groq reset headers look like '2m59.56s', '7.66s' or '120ms'."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+# 1. Rate-Limit Budget
+
+class RateLimitBudget:
+    """
+    Request and token budget mirrored from the x-ratelimit-* response headers.
+    Between responses the budget is decremented locally for every admitted call,
+    and treated as replenished once the advertised reset time has passed.
+
+    The headers describe the whole account, which every prefork worker draws
+    on; `share` (1 / worker count) scales them to this process's slice so N
+    workers don't each spend the full remainder before the next response.
+    """
+
+    def __init__(self, share: float = 1.0):
+        self.share = share
+        self.limit_requests: Optional[int] = None
+        self.remaining_requests: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.limit_tokens: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0  # Set by 429 retry-after
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+
+        def _int(name: str) -> Optional[int]:
+            try:
+                return int(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        limit = self._scaled(_int("x-ratelimit-limit-requests"))
+        remaining = self._scaled(_int("x-ratelimit-remaining-requests"))
+        if remaining is not None:
+            self.limit_requests = limit or self.limit_requests
+            self.remaining_requests = remaining
+            self.requests_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-requests")) or 60.0)
+
+        limit = self._scaled(_int("x-ratelimit-limit-tokens"))
+        remaining = self._scaled(_int("x-ratelimit-remaining-tokens"))
+        if remaining is not None:
+            self.limit_tokens = limit or self.limit_tokens
+            self.remaining_tokens = remaining
+            self.tokens_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-tokens")) or 60.0)
+
+    def _scaled(self, value: Optional[int]) -> Optional[int]:
+        return None if value is None else int(value * self.share)
+
+    def on_rate_limited(self, headers: Mapping[str, str]) -> None:
+        self.update_from_headers(headers)
+        retry_after = parse_reset(headers.get("retry-after")) or 1.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def wait_time(self, tokens: int, reserve: float = 0.0) -> float:
+        """
+        Seconds until a call of `tokens` fits, keeping `reserve` (a fraction of
+        each limit) untouched. 0.0 means admit now.
+        """
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        wait = 0.0
+        if self.remaining_requests is not None and now < self.requests_reset_at:
+            floor = (self.limit_requests or 0) * reserve
+            if self.remaining_requests - 1 < floor:
+                wait = max(wait, self.requests_reset_at - now)
+        if self.remaining_tokens is not None and now < self.tokens_reset_at:
+            floor = (self.limit_tokens or 0) * reserve
+            if self.remaining_tokens - tokens < floor:
+                wait = max(wait, self.tokens_reset_at - now)
+        return wait
+
+    def consume(self, tokens: int) -> None:
+        now = time.monotonic()
+        if self.remaining_requests is not None and now < self.requests_reset_at:
+            self.remaining_requests -= 1
+        if self.remaining_tokens is not None and now < self.tokens_reset_at:
+            self.remaining_tokens -= tokens
+
+
+# 2. Priority Scheduler
+
+class LLMScheduler:
+    """
+    Central admission control for all Groq calls in the process.
+
+    Work is queued by (priority, arrival). The head of the queue is admitted
+    once a concurrency slot is free and the rate-limit budget allows it; batch
+    work additionally leaves `batch_reserve` of each budget for interactive
+    requests. Work that cannot be admitted within its priority's wait limit is
+    shed with LLMOverloaded instead of being sent to hit a 429.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = settings.LLM_MAX_CONCURRENT,
+                 batch_reserve: float = settings.LLM_BATCH_RESERVE,
+                 max_wait: Optional[Dict[Priority, float]] = None):
+        self.max_concurrent = max_concurrent
+        self.batch_reserve = batch_reserve
+        self.max_wait = max_wait or {
+            Priority.INTERACTIVE: settings.LLM_INTERACTIVE_MAX_WAIT,
+            Priority.BATCH: settings.LLM_BATCH_MAX_WAIT,
+        }
+        self.budget = RateLimitBudget()
+
+        self._cond = threading.Condition()
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+
+        # Metrics
+        self._admitted = 0
+        self._shed = 0
+        self._rate_limited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def run(self,
+            call: Callable[[], Any],
+            priority: Priority = Priority.INTERACTIVE,
+            estimated_tokens: int = 1024) -> Any:
+        """
+        Runs `call` once admitted. `call` should return an OpenAI raw response
+        (`.with_raw_response.create(...)`) so the budget can track its headers;
+        the parsed completion is returned.
+        """
+        self._admit(priority, estimated_tokens)
+        try:
+            raw = call()
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if getattr(response, "status_code", None) == 429:
+                with self._cond:
+                    self._rate_limited += 1
+                    self.budget.on_rate_limited(response.headers)
+            raise
+        finally:
+            self._release()
+
+        headers = getattr(raw, "headers", None)
+        if headers is not None:
+            with self._cond:
+                self.budget.update_from_headers(headers)
+                self._cond.notify_all()
+        return raw.parse() if hasattr(raw, "parse") else raw
+
+    def _admit(self, priority: Priority, tokens: int) -> None:
+        entry = (int(priority), next(self._seq))
+        enqueued = time.monotonic()
+        deadline = enqueued + self.max_wait[priority]
+        reserve = self.batch_reserve if priority >= Priority.BATCH else 0.0
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            while True:
+                now = time.monotonic()
+                budget_wait = None
+                if self._queue[0] == entry and self._in_flight < self.max_concurrent:
+                    budget_wait = self.budget.wait_time(tokens, reserve)
+                    if budget_wait <= 0:
+                        heapq.heappop(self._queue)
+                        self._in_flight += 1
+                        self.budget.consume(tokens)
+                        waited = now - enqueued
+                        self._admitted += 1
+                        self._wait_total += waited
+                        self._wait_max = max(self._wait_max, waited)
+                        self._cond.notify_all()
+                        return
+
+                remaining = deadline - now
+                if remaining <= 0 or (budget_wait is not None and budget_wait > remaining):
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._shed += 1
+                    self._cond.notify_all()
+                    raise LLMOverloaded(
+                        f"LLM capacity unavailable for {Priority(priority).name.lower()} work "
+                        f"(queue depth {len(self._queue)})"
+                    )
+                self._cond.wait(timeout=min(budget_wait or remaining, remaining))
+
+    def set_worker_count(self, workers: int) -> None:
+        """Called by the prefork server before forking: each worker budgets 1/workers of the account."""
+        with self._cond:
+            self.budget.share = 1.0 / max(1, workers)
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "rate_limited": self._rate_limited,
+                "avg_wait_seconds": (self._wait_total / self._admitted) if self._admitted else 0.0,
+                "max_wait_seconds": self._wait_max,
+                "remaining_requests": self.budget.remaining_requests,
+                "remaining_tokens": self.budget.remaining_tokens,
+            }
+
+
+# Shared by every LLMService in the process
+llm_scheduler = LLMScheduler()
@@ -1,13 +1,26 @@
 import os
 import sys
 import json
+import logging
 from openai import OpenAI
 from pharma_guard.core.config import settings
+from pharma_guard.core.llm_scheduler import llm_scheduler, LLMOverloaded, Priority
+from pharma_guard.core.shared_cache import get_shared_cache, content_key
+from pharma_guard.core.single_flight import SingleFlight
 from pharma_guard.models.schemas import LLMExplanation, RiskLabel, Phenotype
 
+logger = logging.getLogger(__name__)
+
+# Added to the prompt estimate (~4 chars per token) for the JSON answer
+RESPONSE_TOKEN_ALLOWANCE = 512
+
+# Identical prompts in flight at the same time share one Groq call
+llm_flights = SingleFlight()
+
 class LLMService:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, priority: Priority = Priority.INTERACTIVE):
         self.client = None
+        self.priority = priority
         
         # Prioritize passed key, then settings
         key = api_key or settings.GROQ_API_KEY
@@ -16,12 +29,55 @@ class LLMService:
             try:
                 self.client = OpenAI(
                     api_key=key,
-                    base_url="https://api.groq.com/openai/v1"
+                    base_url="https://api.groq.com/openai/v1",
+                    # 429s must reach the scheduler, not be retried inside a held slot
+                    max_retries=0
                 )
                 self.model_name = "llama-3.3-70b-versatile" # Using a supported model on Groq
             except Exception as e:
                 print(f"DEBUG: Failed to configure Groq/OpenAI client: {e}", file=sys.stderr)
 
+    def _complete(self, prompt: str) -> str:
+        """
+        Single JSON-mode chat completion, admitted through the shared scheduler.
+        Answers are cached across workers, keyed on model + prompt; concurrent
+        identical prompts of the same priority are coalesced into one call, so
+        an interactive request never waits on a batch leader that may be shed.
+        """
+        cache = get_shared_cache()
+        key = content_key(self.model_name, prompt)
+        if cache:
+            cached = cache.get("llm", key)
+            if cached is not None:
+                return cached
+
+        flight_key = f"{self.priority.name}:{key}"
+        return llm_flights.do(flight_key, lambda: self._request(prompt, key, cache))
+
+    def _request(self, prompt: str, key: str, cache) -> str:
+        chat_completion = llm_scheduler.run(
+            lambda: self.client.chat.completions.with_raw_response.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a helpful assistant that outputs JSON only."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ],
+                model=self.model_name,
+                response_format={"type": "json_object"},
+            ),
+            priority=self.priority,
+            estimated_tokens=len(prompt) // 4 + RESPONSE_TOKEN_ALLOWANCE,
+        )
+        text = chat_completion.choices[0].message.content
+        if cache:
+            cache.set("llm", key, text)
+        return text
+
     def generate_explanation(self, 
                              gene: str, 
                              drug: str, 
@@ -58,22 +114,7 @@ class LLMService:
             )
 
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that outputs JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=self.model_name,
-                response_format={"type": "json_object"},
-            )
-            
-            text = chat_completion.choices[0].message.content
+            text = self._complete(prompt)
             data = json.loads(text)
             
             return LLMExplanation(
@@ -83,6 +124,14 @@ class LLMService:
                 dosing_rationale=data.get("dosing_rationale", "Rationale unavailable.")
             )
             
+        except LLMOverloaded as e:
+            logger.warning("LLM work shed (explanation): %s", e)
+            return LLMExplanation(
+                summary=f"Analysis for {drug} ({phenotype.value}).",
+                biological_mechanism="Explanation deferred: LLM capacity is currently reserved for interactive requests.",
+                clinical_implication=f"Risk: {risk.value}",
+                dosing_rationale="Consult CPIC guidelines."
+            )
         except Exception as e:
             print(f"DEBUG: Groq API Error: {e}", file=sys.stderr)
             return LLMExplanation(
@@ -141,26 +190,14 @@ class LLMService:
             return f"Recommendation unavailable (No API). Default action: Consult guidelines for {phenotype.value}."
 
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that outputs JSON only."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=self.model_name,
-                response_format={"type": "json_object"},
-            )
-            
-            text = chat_completion.choices[0].message.content
+            text = self._complete(prompt)
             data = json.loads(text)
             
             return data.get("recommendation_action", "Recommendation unavailable.")
             
+        except LLMOverloaded as e:
+            logger.warning("LLM work shed (recommendation): %s", e)
+            return "Recommendation deferred: LLM capacity is currently reserved for interactive requests."
         except Exception as e:
             print(f"DEBUG: Groq API Error (Recommendation): {e}", file=sys.stderr)
             return "Recommendation unavailable due to API error."
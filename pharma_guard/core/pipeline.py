@@ -0,0 +1,139 @@
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pharma_guard.core.cpic_logic import calculate_phenotypes, analyze_risk, drug_genes, evaluate_panel
+from pharma_guard.core.llm_service import LLMService
+from pharma_guard.core.shared_cache import SharedCache
+from pharma_guard.core.variants import DetectionTable
+from pharma_guard.core.vcf_parser import parse_vcf_profile
+from pharma_guard.models.schemas import (
+    AnalysisResponse,
+    GeneCall,
+    RiskAssessment,
+    PharmacogenomicProfile,
+    ClinicalRecommendation,
+    Phenotype,
+    QualityMetrics
+)
+
+
+def parse_drug_list(drug_name: str) -> List[str]:
+    """'Codeine, Warfarin' -> ['Codeine', 'Warfarin']"""
+    return [d.strip() for d in drug_name.split(",") if d.strip()]
+
+
+def manifest_entry(line: str) -> Optional[Tuple[str, str]]:
+    """
+    One manifest line -> (patient_id, vcf_path): 'patient_id<TAB>vcf_path'
+    or just a path (patient_id = file name stem). None for blanks and '#' comments.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if '\t' in line:
+        patient_id, vcf_path = line.split('\t', 1)
+    else:
+        vcf_path = line
+        patient_id = os.path.splitext(os.path.basename(vcf_path))[0]
+    return patient_id.strip(), vcf_path.strip()
+
+
+def read_manifest(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (patient_id, vcf_path) for every entry of a manifest file, lazily."""
+    with open(path, 'r') as f:
+        for line in f:
+            entry = manifest_entry(line)
+            if entry:
+                yield entry
+
+
+def build_responses(patient_id: str,
+                    genotypes: Dict[str, List[str]],
+                    phenotypes: Dict[str, Phenotype],
+                    detections: DetectionTable,
+                    quality_metrics: QualityMetrics,
+                    drugs: Iterable[str],
+                    llm_service: LLMService) -> Iterator[AnalysisResponse]:
+    """
+    Shared per-drug pipeline for the API and CLI: risk analysis, LLM
+    explanation and recommendation, response construction. Yields one
+    AnalysisResponse per drug so callers can stream them.
+
+    Detections are converted to Pydantic models once here and the same list
+    is shared by every drug's profile. Risk calls for the whole panel come
+    from one pass over the called genes (evaluate_panel); drugs it didn't
+    reach (unknown drugs, genes not called) fall back to analyze_risk().
+    """
+    detected_variants = detections.to_models()
+    drugs = list(drugs)
+    calls = evaluate_panel(phenotypes, drugs)
+    for drug in drugs:
+        # Drug-Gene Risk Analysis
+        risk_label, severity, confidence, gene = calls.get(drug.upper().strip()) or analyze_risk(drug, phenotypes)
+
+        # Prepare Data for LLM Explanation
+        primary_phenotype = phenotypes.get(gene, Phenotype.UNKNOWN)
+        diplotype_list = genotypes.get(gene, ["?", "?"])
+        primary_diplotype = "/".join(diplotype_list)
+
+        # Generate LLM Explanation
+        explanation = llm_service.generate_explanation(
+            gene=gene,
+            drug=drug,
+            phenotype=primary_phenotype,
+            diplotype=primary_diplotype,
+            risk=risk_label,
+            severity=severity.value
+        )
+
+        # Generate Clinical Recommendation
+        recommendation_text = llm_service.generate_clinical_recommendation(
+            gene=gene,
+            drug=drug,
+            phenotype=primary_phenotype,
+            diplotype=primary_diplotype,
+            risk=risk_label,
+            severity=severity.value
+        )
+
+        # Construct Response
+        yield AnalysisResponse(
+            patient_id=patient_id,
+            drug=drug,
+            timestamp=datetime.now(),
+            risk_assessment=RiskAssessment(
+                risk_label=risk_label,
+                confidence_score=confidence,
+                severity=severity
+            ),
+            pharmacogenomic_profile=PharmacogenomicProfile(
+                primary_gene=gene,
+                diplotype=primary_diplotype,
+                phenotype=primary_phenotype,
+                detected_variants=detected_variants,
+                diplotype_ambiguous=gene in quality_metrics.ambiguous_diplotypes,
+                secondary_genes=[
+                    GeneCall(gene=g, diplotype="/".join(genotypes[g]), phenotype=phenotypes.get(g, Phenotype.UNKNOWN),
+                             diplotype_ambiguous=g in quality_metrics.ambiguous_diplotypes)
+                    for g in drug_genes(drug)[1:] if g in genotypes
+                ]
+            ),
+            clinical_recommendation=ClinicalRecommendation(
+                action=recommendation_text,
+                cpic_alignment=True
+            ),
+            llm_generated_explanation=explanation,
+            quality_metrics=quality_metrics
+        )
+
+
+def analyze_vcf(patient_id: str,
+                vcf_path: str,
+                drugs: Iterable[str],
+                llm_service: LLMService,
+                cache: Optional[SharedCache] = None) -> Iterator[AnalysisResponse]:
+    """Parse -> phenotypes -> per-drug responses for one VCF, lazily."""
+    genotypes, detections, quality_metrics = parse_vcf_profile(vcf_path, cache)
+    phenotypes = calculate_phenotypes(genotypes)
+    yield from build_responses(patient_id, genotypes, phenotypes, detections, quality_metrics, drugs, llm_service)
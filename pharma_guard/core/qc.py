@@ -0,0 +1,135 @@
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from pharma_guard.core.config import settings
+from pharma_guard.models.schemas import DistributionStats, GeneQC, LowCoverageSite, QualityMetrics
+
+# Histogram lower bounds; the last bin is open-ended
+DEPTH_BINS = (0, 10, 20, 30, 50, 100)
+GQ_BINS = (0, 10, 20, 30, 60, 99)
+
+
+def _bin_labels(bounds: Tuple[int, ...]) -> List[str]:
+    labels = [f"{lo}-{hi - 1}" for lo, hi in zip(bounds, bounds[1:])]
+    return labels + [f"{bounds[-1]}+"]
+
+
+class RunningStats:
+    """
+    Count / mean / min / max plus a fixed-bin histogram. add() only tallies
+    the field as read ('68', 68, '.'): DP and GQ take a few hundred distinct
+    values at most, so memory stays bounded, and each distinct value is
+    converted with to_int() once, in to_model().
+    """
+
+    __slots__ = ("bounds", "counts")
+
+    def __init__(self, bounds: Tuple[int, ...]):
+        self.bounds = bounds
+        self.counts: Dict[Any, int] = {}
+
+    def add(self, value: Any) -> None:
+        self.counts[value] = self.counts.get(value, 0) + 1
+
+    def to_model(self) -> Optional[DistributionStats]:
+        values: Dict[int, int] = {}
+        for raw, n in self.counts.items():
+            value = to_int(raw)
+            if value is not None:
+                values[value] = values.get(value, 0) + n
+        if not values:
+            return None
+        count = sum(values.values())
+        bins = [0] * len(self.bounds)
+        for value, n in values.items():
+            bins[max(bisect_right(self.bounds, value) - 1, 0)] += n
+        return DistributionStats(
+            count=count,
+            mean=round(sum(value * n for value, n in values.items()) / count, 2),
+            min=min(values),
+            max=max(values),
+            histogram={label: n for label, n in zip(_bin_labels(self.bounds), bins) if n},
+        )
+
+
+class QCAccumulator:
+    """
+    Per-record QC folded in while the parser streams the VCF: FILTER counts,
+    DP/GQ distributions, per-gene call rate and low-coverage pharmacogene
+    sites. Memory is bounded by the number of distinct genes/FILTER columns
+    plus the capped flagged-site list, never by record count.
+
+    add() runs once per record, so it only tallies: FILTER columns and DP/GQ
+    fields are counted as raw values and parsed per distinct value in fill().
+    """
+
+    def __init__(self, min_depth: int = settings.QC_MIN_DEPTH,
+                 max_flagged: int = settings.QC_MAX_FLAGGED_SITES):
+        self.min_depth = min_depth
+        self.max_flagged = max_flagged
+        self.total = 0
+        self.filter_columns: Dict[str, int] = {}  # Raw ';'-joined FILTER column -> records
+        self.depth = RunningStats(DEPTH_BINS)
+        self.gq = RunningStats(GQ_BINS)
+        self.genes: Dict[str, List[int]] = {}  # gene -> [sites, called, low coverage]
+        self.flagged: List[LowCoverageSite] = []
+
+    def add(self, filters: str, gene: Optional[str], chrom: str, pos: int, rsid: str,
+            called: bool, depth: Any, gq: Any) -> None:
+        """depth / gq are the raw DP / GQ fields (None when absent)."""
+        self.total += 1
+        self.filter_columns[filters] = self.filter_columns.get(filters, 0) + 1
+
+        if depth is not None:
+            counts = self.depth.counts
+            counts[depth] = counts.get(depth, 0) + 1
+        if gq is not None:
+            counts = self.gq.counts
+            counts[gq] = counts.get(gq, 0) + 1
+
+        if gene is None:
+            return
+        depth = to_int(depth)
+        stats = self.genes.setdefault(gene, [0, 0, 0])
+        stats[0] += 1
+        if called:
+            stats[1] += 1
+        if depth is not None and depth < self.min_depth:
+            stats[2] += 1
+            if len(self.flagged) < self.max_flagged:
+                self.flagged.append(LowCoverageSite(gene=gene, chrom=chrom, pos=pos, rsid=rsid, depth=depth))
+
+    def fill(self, metrics: QualityMetrics) -> QualityMetrics:
+        filter_counts: Dict[str, int] = {}
+        passed = 0
+        for column, n in self.filter_columns.items():
+            filters = [f for f in column.split(";") if f] or ["."]
+            for f in filters:
+                filter_counts[f] = filter_counts.get(f, 0) + n
+            # "." = no filters applied, counted with PASS
+            if all(f in ("PASS", ".") for f in filters):
+                passed += n
+        metrics.total_records = self.total
+        metrics.filter_pass = passed
+        metrics.filter_fail = self.total - passed
+        metrics.filter_counts = filter_counts
+        metrics.depth = self.depth.to_model()
+        metrics.genotype_quality = self.gq.to_model()
+        metrics.gene_qc = {
+            gene: GeneQC(sites=sites, called=called, call_rate=round(called / sites, 4), low_coverage_sites=low)
+            for gene, (sites, called, low) in self.genes.items()
+        }
+        metrics.low_coverage_sites = list(self.flagged)
+        return metrics
+
+
+def to_int(value) -> Optional[int]:
+    """FORMAT/INFO numbers arrive as '68', '.', None or 1-tuples from pysam."""
+    if type(value) is str and value.isdecimal():  # Hot path: plain text field
+        return int(value)
+    if isinstance(value, (tuple, list)):
+        value = value[0] if value else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,195 @@
+from typing import Any, Dict, List, Optional
+
+from pharma_guard.core.cpic_logic import calculate_phenotypes, analyze_risk, phenotype_key
+from pharma_guard.core.llm_service import LLMService
+from pharma_guard.core.result_store import ResultStore
+from pharma_guard.models.schemas import Phenotype, RiskLabel
+
+ALL = "*"  # Every diplotype / phenotype of a gene or drug is affected
+
+
+# 1. Rule Diff
+
+def diff_rules(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compares two cpic_logic.rule_snapshot()s.
+    Returns:
+      alleles:         {gene: [alleles whose activity score changed]}
+      phenotype_logic: [genes whose diplotype -> phenotype table changed]
+      risk_logic:      RULES_LOGIC_VERSION was bumped
+      drugs:           {drug: [phenotype keys whose (risk, severity) changed] or ["*"]}
+                       (keys are combined, e.g. "IM|PM|NM", for multi-gene drugs)
+    """
+    alleles: Dict[str, List[str]] = {}
+    for gene in set(old["activity"]) | set(new["activity"]):
+        before, after = old["activity"].get(gene, {}), new["activity"].get(gene, {})
+        changed = sorted(a for a in set(before) | set(after) if before.get(a) != after.get(a))
+        if changed:
+            alleles[gene] = changed
+
+    logic = sorted(
+        gene for gene in set(old["phenotype_logic"]) | set(new["phenotype_logic"])
+        if old["phenotype_logic"].get(gene) != new["phenotype_logic"].get(gene)
+    )
+
+    drugs: Dict[str, List[str]] = {}
+    for drug in set(old["drugs"]) | set(new["drugs"]):
+        before, after = old["drugs"].get(drug), new["drugs"].get(drug)
+        if (before is None or after is None or before["gene"] != after["gene"]
+                or before.get("genes", [before["gene"]]) != after.get("genes", [after["gene"]])):
+            drugs[drug] = [ALL]
+            continue
+        changed = sorted(
+            p for p in set(before["mapping"]) | set(after["mapping"])
+            if before["mapping"].get(p) != after["mapping"].get(p)
+        )
+        if changed:
+            drugs[drug] = changed
+
+    return {
+        "alleles": alleles,
+        "phenotype_logic": logic,
+        "risk_logic": old["risk_logic"] != new["risk_logic"],
+        "drugs": drugs,
+    }
+
+
+def is_affected(changes: Optional[Dict[str, Any]], drug: str, gene: str,
+                alleles: List[str], phenotype: str,
+                secondary: Optional[Dict[str, List[str]]] = None) -> bool:
+    """
+    Whether a stored (drug, gene, diplotype, phenotype) result can differ under
+    the new rules. For multi-gene drugs `phenotype` is the combined key and
+    `secondary` maps the other genes to their stored alleles.
+    """
+    if changes is None or changes["risk_logic"]:
+        return True  # Unknown or globally changed rules: recompute
+    genotypes = {gene: alleles, **(secondary or {})}
+    for g, g_alleles in genotypes.items():
+        if g in changes["phenotype_logic"]:
+            return True
+        if set(g_alleles) & set(changes["alleles"].get(g, [])):
+            return True
+    drug_changes = changes["drugs"].get(drug.upper(), [])
+    return ALL in drug_changes or phenotype in drug_changes
+
+
+# 2. Re-analysis Job
+
+def reanalyze(store: ResultStore, llm_service: Optional[LLMService] = None,
+              after: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Brings stored results up to the currently loaded rules.
+
+    Results computed under an older rules version are diffed against it; only
+    those whose (gene, diplotype) or (drug, phenotype) entries changed are
+    recomputed, from the stored diplotypes (no VCF re-parse). Unaffected
+    results are just re-tagged. If `llm_service` is given, explanations and
+    recommendations are regenerated for results whose call changed.
+
+    At most `limit` stale results after cursor `after` are scanned per call;
+    `next_cursor` is where to resume, or None once the scan reached the end.
+    """
+    current = store.current_rules_version()
+    new_snapshot = store.get_rule_snapshot(current)
+    diffs: Dict[Optional[str], Optional[Dict[str, Any]]] = {}
+
+    report: Dict[str, Any] = {
+        "rules_version": current,
+        "scanned": 0,
+        "recomputed": 0,
+        "changed": [],
+        "skipped": [],
+        "rule_changes": {},
+        "next_cursor": None,
+    }
+
+    for cursor, version, record in store.iter_stale(current, after=after, limit=limit):
+        report["scanned"] += 1
+        if limit is not None and report["scanned"] == limit:
+            report["next_cursor"] = cursor
+        if version not in diffs:
+            old_snapshot = store.get_rule_snapshot(version) if version else None
+            diffs[version] = diff_rules(old_snapshot, new_snapshot) if old_snapshot else None
+            report["rule_changes"][version or "unversioned"] = diffs[version]
+        changes = diffs[version]
+
+        drug = record["drug"]
+        profile = record["pharmacogenomic_profile"]
+        gene = profile["primary_gene"]
+        alleles = profile["diplotype"].split("/")
+        secondary = {g["gene"]: g["diplotype"].split("/") for g in profile.get("secondary_genes", [])}
+
+        # Combined key in the rule's gene order; genes a result predates count as Unknown
+        stored = {gene: profile["phenotype"], **{g["gene"]: g["phenotype"] for g in profile.get("secondary_genes", [])}}
+        rule_genes = new_snapshot["drugs"].get(drug.upper().strip(), {}).get("genes", [gene])
+        key = phenotype_key(stored.get(g, Phenotype.UNKNOWN) for g in rule_genes)
+
+        if not is_affected(changes, drug, gene, alleles, key, secondary):
+            store.update(cursor, current)
+            continue
+
+        report["recomputed"] += 1
+        phenotypes = calculate_phenotypes({
+            g: g_alleles for g, g_alleles in {gene: alleles, **secondary}.items() if "?" not in g_alleles
+        })
+        risk_label, severity, confidence, new_gene = analyze_risk(drug, phenotypes)
+        if new_gene != gene:
+            # Drug now keyed to a gene whose diplotype was never stored; marked
+            # so later runs don't scan it again (see ResultStore.needs_reparse)
+            reason = f"rules now use {new_gene}; re-run the VCF to call it"
+            store.mark_needs_reparse(cursor, current, reason)
+            report["skipped"].append({
+                "export_cursor": cursor, "patient_id": record["patient_id"], "drug": drug, "reason": reason,
+            })
+            continue
+
+        phenotype = phenotypes.get(gene, Phenotype.UNKNOWN)
+        old = {
+            "phenotype": profile["phenotype"],
+            "secondary_phenotypes": {g["gene"]: g["phenotype"] for g in profile.get("secondary_genes", [])},
+            "risk_label": record["risk_assessment"]["risk_label"],
+            "severity": record["risk_assessment"]["severity"],
+            "confidence_score": record["risk_assessment"]["confidence_score"],
+        }
+        new = {
+            "phenotype": phenotype.value,
+            "secondary_phenotypes": {g: phenotypes.get(g, Phenotype.UNKNOWN).value for g in old["secondary_phenotypes"]},
+            "risk_label": risk_label.value,
+            "severity": severity.value,
+            "confidence_score": confidence,
+        }
+
+        if old == new:
+            store.update(cursor, current)
+            continue
+
+        profile["phenotype"] = new["phenotype"]
+        for call in profile.get("secondary_genes", []):
+            call["phenotype"] = new["secondary_phenotypes"][call["gene"]]
+        record["risk_assessment"].update(
+            risk_label=new["risk_label"], severity=new["severity"], confidence_score=confidence
+        )
+        # The LLM text only depends on the primary call
+        call_changed = any(old[k] != new[k] for k in ("phenotype", "risk_label", "severity"))
+        if llm_service is not None and call_changed:
+            record["llm_generated_explanation"] = llm_service.generate_explanation(
+                gene=gene, drug=drug, phenotype=phenotype, diplotype=profile["diplotype"],
+                risk=RiskLabel(risk_label), severity=severity.value
+            ).model_dump()
+            record["clinical_recommendation"]["action"] = llm_service.generate_clinical_recommendation(
+                gene=gene, drug=drug, phenotype=phenotype, diplotype=profile["diplotype"],
+                risk=RiskLabel(risk_label), severity=severity.value
+            )
+        store.update(cursor, current, record)
+        report["changed"].append({
+            "export_cursor": cursor,
+            "patient_id": record["patient_id"],
+            "drug": drug,
+            "gene": gene,
+            "diplotype": profile["diplotype"],
+            "old": old,
+            "new": new,
+        })
+
+    return report
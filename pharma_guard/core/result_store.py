@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pharma_guard.core.config import settings
+from pharma_guard.core.cpic_logic import rule_snapshot, rules_version
+from pharma_guard.core.shared_cache import create_private, private_dir
+from pharma_guard.models.schemas import AnalysisResponse
+
+# How often add() sweeps out records past the retention window
+PRUNE_INTERVAL = 3600.0
+
+
+class ResultStore:
+    """
+    SQLite log of AnalysisResponse records.
+
+    Each stored record gets a monotonically increasing row id which doubles as
+    the export cursor: resuming an export "after N" is a primary-key range
+    scan. Reads page through keyset queries (id > last LIMIT n) so exports
+    run in constant memory no matter how many patients are stored.
+
+    Every record is tagged with the CPIC rules version it was computed under,
+    and each version's rule snapshot is kept so later rule edits can be diffed
+    against it (see core/reanalysis.py).
+
+    Records are full patient analyses: the file is created 0600 in the private
+    cache directory, and records older than the retention window are pruned.
+    """
+
+    def __init__(self, path: Optional[str] = None, retention: Optional[float] = None):
+        self.path = path or settings.RESULTS_PATH or os.path.join(private_dir(), "pharma_guard_results.sqlite3")
+        self.retention = retention if retention is not None else settings.RESULTS_RETENTION_SECONDS
+        self._local = threading.local()
+        self._last_prune = 0.0
+        self._registered_version: Optional[str] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            create_private(self.path)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "patient_id TEXT NOT NULL, drug TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_patient ON results (patient_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "rules_version" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN rules_version TEXT")
+            if "reparse_reason" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN reparse_reason TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rule_snapshots ("
+                "version TEXT PRIMARY KEY, snapshot TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def current_rules_version(self) -> str:
+        """Version of the rules loaded in this process, snapshotted once."""
+        if self._registered_version is None:
+            snapshot = rule_snapshot()
+            version = rules_version(snapshot)
+            self._conn().execute(
+                "INSERT OR IGNORE INTO rule_snapshots (version, snapshot, created) VALUES (?, ?, ?)",
+                (version, json.dumps(snapshot), time.time()),
+            )
+            self._registered_version = version
+        return self._registered_version
+
+    def get_rule_snapshot(self, version: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT snapshot FROM rule_snapshots WHERE version = ?", (version,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, response: AnalysisResponse) -> int:
+        """Stores one response and returns its cursor."""
+        now = time.time()
+        if now - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = now
+            self.prune(now)
+        cur = self._conn().execute(
+            "INSERT INTO results (patient_id, drug, payload, created, rules_version) VALUES (?, ?, ?, ?, ?)",
+            (response.patient_id, response.drug.upper(), response.model_dump_json(), now,
+             self.current_rules_version()),
+        )
+        return cur.lastrowid
+
+    def iter_stale(self, version: str, after: int = 0, limit: Optional[int] = None,
+                   batch_size: int = 500) -> Iterator[Tuple[int, Optional[str], Dict[str, Any]]]:
+        """
+        Yields (cursor, rules_version, record) for records not computed under
+        `version`, starting after `after`. Pages by id with a fresh query per
+        batch, so callers may update() the yielded records while iterating.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            batch = self._conn().execute(
+                "SELECT id, rules_version, payload FROM results "
+                "WHERE id > ? AND (rules_version IS NULL OR rules_version != ?) ORDER BY id LIMIT ?",
+                (after, version, size),
+            ).fetchall()
+            if not batch:
+                return
+            for row_id, row_version, payload in batch:
+                yield row_id, row_version, json.loads(payload)
+            after = batch[-1][0]
+            if remaining is not None:
+                remaining -= len(batch)
+
+    def update(self, cursor: int, version: str, record: Optional[Dict[str, Any]] = None) -> None:
+        """Re-tags a record with `version`, replacing its payload if given."""
+        if record is None:
+            self._conn().execute(
+                "UPDATE results SET rules_version = ?, reparse_reason = NULL WHERE id = ?", (version, cursor)
+            )
+        else:
+            self._conn().execute(
+                "UPDATE results SET rules_version = ?, reparse_reason = NULL, payload = ? WHERE id = ?",
+                (version, json.dumps(record, default=str), cursor),
+            )
+
+    def mark_needs_reparse(self, cursor: int, version: str, reason: str) -> None:
+        """
+        Tags a record that `version` rules can't recompute from its stored
+        diplotypes, so it leaves the stale set but stays listed by needs_reparse().
+        """
+        self._conn().execute(
+            "UPDATE results SET rules_version = ?, reparse_reason = ? WHERE id = ?", (version, reason, cursor)
+        )
+
+    def needs_reparse(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT id, patient_id, drug, reparse_reason FROM results WHERE reparse_reason IS NOT NULL ORDER BY id"
+        ).fetchall()
+        return [{"export_cursor": row_id, "patient_id": patient_id, "drug": drug, "reason": reason}
+                for row_id, patient_id, drug, reason in rows]
+
+    def iter_results(self, after: int = 0, limit: Optional[int] = None,
+                     batch_size: int = 500) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yields (cursor, record dict) in cursor order, starting after `after`.
+        Each batch is its own keyset query, with no cursor held across yields:
+        StreamingResponse resumes sync generators on any threadpool thread,
+        and sqlite objects can't cross threads.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            batch = self._conn().execute(
+                "SELECT id, payload FROM results WHERE id > ? ORDER BY id LIMIT ?", (after, size)
+            ).fetchall()
+            if not batch:
+                return
+            for row_id, payload in batch:
+                yield row_id, json.loads(payload)
+            after = batch[-1][0]
+            if remaining is not None:
+                remaining -= len(batch)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Deletes records older than the retention window; returns how many."""
+        if not self.retention:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self.retention
+        return self._conn().execute("DELETE FROM results WHERE created < ?", (cutoff,)).rowcount
+
+    def last_cursor(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM results").fetchone()
+        return row[0] or 0
+
+
+_RESULT_STORE: Optional[ResultStore] = None
+
+def get_result_store() -> Optional[ResultStore]:
+    """Process-wide store, or None when RESULTS_STORE_ENABLED is off."""
+    global _RESULT_STORE
+    if not settings.RESULTS_STORE_ENABLED:
+        return None
+    if _RESULT_STORE is None:
+        _RESULT_STORE = ResultStore()
+    return _RESULT_STORE
@@ -0,0 +1,303 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pharma_guard.core.config import settings
+from pharma_guard.core.cpic_logic import calculate_phenotypes
+from pharma_guard.core.export import ndjson_lines
+from pharma_guard.core.llm_service import LLMService
+from pharma_guard.core.pipeline import build_responses, manifest_entry
+from pharma_guard.core.shared_cache import file_digest
+from pharma_guard.core.star_annotation import StarAlleleIndex
+from pharma_guard.core.vcf_parser import VCFParser
+
+PENDING, RUNNING, DONE = "pending", "running", "done"
+
+
+class ShardLeaseLost(Exception):
+    """Another worker took the shard over after this one's lease expired."""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _write_atomic(path: str, chunks) -> None:
+    """Writes to a temp file in the same directory, fsyncs, then renames into place."""
+    tmp = f"{path}.tmp.{socket.gethostname()}.{os.getpid()}"
+    try:
+        with open(tmp, "w") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# 1. Shard Ledger
+
+class ShardLedger:
+    """
+    SQLite coordination file for one sharded cohort run (<run_dir>/ledger.sqlite3).
+
+    The manifest is split once into fixed-size shards, each remembered by the
+    byte offset of its first entry so a worker can seek straight to it. Any
+    number of processes, on this host or on others sharing the directory
+    over a filesystem with working locks, claim shards under a lease
+    (BEGIN IMMEDIATE serializes claims). A worker that dies simply stops
+    renewing; its shard is re-claimed once the lease runs out.
+    """
+
+    def __init__(self, run_dir: str):
+        self.run_dir = run_dir
+        os.makedirs(run_dir, exist_ok=True)
+        self.path = os.path.join(run_dir, "ledger.sqlite3")
+        self._conn_obj: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._conn_obj is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                "shard INTEGER PRIMARY KEY, start_offset INTEGER NOT NULL, start_index INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, status TEXT NOT NULL, owner TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, error TEXT)"
+            )
+            self._conn_obj = conn
+            self._pid = os.getpid()
+        return self._conn_obj
+
+    def plan(self, manifest_path: str, shard_size: int) -> int:
+        """
+        Splits the manifest into shards on first use; later calls (restarts,
+        extra workers) check they were given the same manifest and size.
+        Returns the number of shards.
+        """
+        digest = file_digest(manifest_path)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta:
+                if meta["manifest_digest"] != digest or int(meta["shard_size"]) != shard_size:
+                    raise ValueError(
+                        f"{self.run_dir} belongs to another run (manifest {meta['manifest_path']}, "
+                        f"shard size {meta['shard_size']}); use a new directory"
+                    )
+            else:
+                rows = []
+                index = 0
+                offset = 0
+                with open(manifest_path, "rb") as f:
+                    for line in f:
+                        if manifest_entry(line.decode("utf-8", errors="replace")):
+                            if index % shard_size == 0:
+                                rows.append((len(rows), offset, index, 0, PENDING))
+                            shard, start_offset, start_index, size, status = rows[-1]
+                            rows[-1] = (shard, start_offset, start_index, size + 1, status)
+                            index += 1
+                        offset += len(line)
+                conn.executemany(
+                    "INSERT INTO shards (shard, start_offset, start_index, size, status) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                    ("manifest_path", os.path.abspath(manifest_path)),
+                    ("manifest_digest", digest),
+                    ("shard_size", str(shard_size)),
+                    ("patients", str(index)),
+                ])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0]
+
+    def claim(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Takes the first pending shard, or a running one whose lease expired."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT shard, start_offset, start_index, size FROM shards "
+                "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY shard LIMIT 1",
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE shards SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE shard = ?",
+                    (RUNNING, owner, now + lease_seconds, row[0]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return dict(zip(("shard", "start_offset", "start_index", "size"), row))
+
+    def renew(self, shard: int, owner: str, lease_seconds: float) -> bool:
+        """Extends the lease; False if the shard was taken over meanwhile."""
+        cur = self._conn().execute(
+            "UPDATE shards SET lease_until = ? WHERE shard = ? AND owner = ? AND status = ?",
+            (time.time() + lease_seconds, shard, owner, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, shard: int, owner: str) -> bool:
+        """Marks the shard done; False if the lease expired and another worker holds it."""
+        cur = self._conn().execute(
+            "UPDATE shards SET status = ?, lease_until = NULL, error = NULL WHERE shard = ? AND owner = ?",
+            (DONE, shard, owner),
+        )
+        return cur.rowcount == 1
+
+    def release(self, shard: int, owner: str, error: str) -> None:
+        """Hands a failed shard back to the pool."""
+        self._conn().execute(
+            "UPDATE shards SET status = ?, owner = NULL, lease_until = NULL, error = ? "
+            "WHERE shard = ? AND owner = ?",
+            (PENDING, error, shard, owner),
+        )
+
+    def shard_numbers(self) -> List[int]:
+        return [row[0] for row in self._conn().execute("SELECT shard FROM shards ORDER BY shard")]
+
+    def progress(self) -> Dict[str, int]:
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0}
+        counts.update(self._conn().execute("SELECT status, COUNT(*) FROM shards GROUP BY status"))
+        return counts
+
+
+# 2. Shard Files
+
+def shard_output_path(run_dir: str, shard: int) -> str:
+    return os.path.join(run_dir, f"shard-{shard:06d}.ndjson")
+
+def shard_marker_path(run_dir: str, shard: int) -> str:
+    return os.path.join(run_dir, f"shard-{shard:06d}.done")
+
+def read_shard_entries(manifest_path: str, start_offset: int, size: int) -> List[Tuple[str, str]]:
+    entries: List[Tuple[str, str]] = []
+    with open(manifest_path, "rb") as f:
+        f.seek(start_offset)
+        for line in f:
+            entry = manifest_entry(line.decode("utf-8", errors="replace"))
+            if entry:
+                entries.append(entry)
+                if len(entries) == size:
+                    break
+    return entries
+
+def iter_run_output(run_dir: str) -> Iterator[str]:
+    """Lines of every committed shard, in manifest order."""
+    for shard in ShardLedger(run_dir).shard_numbers():
+        if not os.path.exists(shard_marker_path(run_dir, shard)):
+            continue
+        with open(shard_output_path(run_dir, shard)) as f:
+            yield from f
+
+
+# 3. Runner
+
+def _shard_lines(shard: Dict[str, Any], entries: List[Tuple[str, str]], drugs: List[str],
+                 llm_service: LLMService, annotation_index: Optional[StarAlleleIndex],
+                 serialize: Callable, heartbeat: Callable[[], None], stats: Dict[str, int]) -> Iterator[str]:
+    for i, (patient_id, vcf_path) in enumerate(entries):
+        cursor = shard["start_index"] + i + 1  # Same numbering as the CLI's --resume-after
+        try:
+            if not os.path.exists(vcf_path):
+                raise FileNotFoundError(f"File not found: {vcf_path}")
+            vcf_parser = VCFParser(vcf_path, annotation_index=annotation_index)
+            genotypes = vcf_parser.parse()
+            phenotypes = calculate_phenotypes(genotypes)
+            responses = build_responses(patient_id, genotypes, phenotypes, vcf_parser.get_detection_table(),
+                                        vcf_parser.quality_metrics, drugs, llm_service)
+            lines = list(serialize((cursor, r.model_dump()) for r in responses))
+        except Exception as e:
+            # One bad sample is recorded, not allowed to wedge the shard forever
+            stats["errors"] += 1
+            lines = [json.dumps({"export_cursor": cursor, "patient_id": patient_id, "error": str(e)}) + "\n"]
+        stats["patients"] += 1
+        yield from lines
+        heartbeat()
+
+
+def run_shards(run_dir: str,
+               manifest_path: str,
+               drugs: List[str],
+               llm_service: LLMService,
+               shard_size: Optional[int] = None,
+               annotation_index: Optional[StarAlleleIndex] = None,
+               serialize: Callable = ndjson_lines,
+               owner: Optional[str] = None,
+               lease_seconds: Optional[float] = None,
+               max_shards: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Claims and processes shards of `manifest_path` until none are left.
+
+    Start as many of these as you like against the same `run_dir`. Each shard
+    is written to a temp file and renamed to shard-NNNNNN.ndjson, then its
+    .done marker is renamed into place. The marker is the commit point: a
+    restarted run skips shards that have one and redoes anything without,
+    overwriting partial output.
+    """
+    shard_size = shard_size or settings.SHARD_SIZE
+    lease_seconds = lease_seconds or settings.SHARD_LEASE_SECONDS
+    owner = owner or default_owner()
+    ledger = ShardLedger(run_dir)
+    ledger.plan(manifest_path, shard_size)
+
+    report = {"owner": owner, "shards": [], "patients": 0, "errors": 0, "skipped": 0, "lost": []}
+    while max_shards is None or len(report["shards"]) < max_shards:
+        shard = ledger.claim(owner, lease_seconds)
+        if shard is None:
+            break
+        number = shard["shard"]
+        marker = shard_marker_path(run_dir, number)
+        if os.path.exists(marker):
+            # Committed before the ledger heard about it (crash between the two)
+            ledger.complete(number, owner)
+            report["skipped"] += 1
+            continue
+
+        stats = {"patients": 0, "errors": 0}
+        try:
+            entries = read_shard_entries(manifest_path, shard["start_offset"], shard["size"])
+            def heartbeat():
+                if not ledger.renew(number, owner, lease_seconds):
+                    raise ShardLeaseLost(f"shard {number} was re-claimed by another worker")
+            _write_atomic(shard_output_path(run_dir, number),
+                          _shard_lines(shard, entries, drugs, llm_service, annotation_index,
+                                       serialize, heartbeat, stats))
+            _write_atomic(marker, [json.dumps({
+                "shard": number, "owner": owner, "completed": time.time(),
+                "first_cursor": shard["start_index"] + 1, **stats,
+            }) + "\n"])
+        except ShardLeaseLost:
+            report["lost"].append(number)
+            continue
+        except Exception as e:
+            ledger.release(number, owner, str(e))
+            raise
+        if not ledger.complete(number, owner):
+            # Re-claimed after our last heartbeat; the new owner finds the marker and completes it
+            report["lost"].append(number)
+            continue
+        report["shards"].append(number)
+        report["patients"] += stats["patients"]
+        report["errors"] += stats["errors"]
+
+    report["progress"] = ledger.progress()
+    return report
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional
+
+from pharma_guard.core.config import settings
+
+# Namespaces whose entries never expire: per-worker cohort aggregates must keep
+# counting patients for as long as the cache file lives
+PERSISTENT_NAMESPACES = frozenset({"cohort"})
+
+
+def content_key(*parts: Any) -> str:
+    """Stable sha256 key over strings/bytes (e.g. namespace, prompt, model)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def private_dir() -> str:
+    """CACHE_DIR, or ~/.cache/pharma_guard; home of the patient-data SQLite files."""
+    return settings.CACHE_DIR or os.path.join(os.path.expanduser("~"), ".cache", "pharma_guard")
+
+
+def create_private(path: str) -> None:
+    """
+    Creates `path` 0600 inside a 0700 directory before SQLite opens it; SQLite
+    gives the -wal/-shm files the same mode as the database.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        # Also tightens a file left behind by an older, world-readable build
+        os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SharedCache:
+    """
+    JSON key-value store backed by a local SQLite file in WAL mode.
+
+    Every worker process of the prefork server opens the same file, so a value
+    cached by one worker (a parsed VCF profile, an LLM answer) is a hit for all
+    of them. Connections are opened lazily per process and per thread, never
+    inherited across fork().
+
+    Cached profiles are patient data, so the file is created with
+    create_private().
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path or settings.CACHE_PATH or os.path.join(private_dir(), "pharma_guard_cache.sqlite3")
+        self.ttl = ttl if ttl is not None else settings.CACHE_TTL_SECONDS
+        self._local = threading.local()
+
+    def _expired(self, namespace: str, created: float, now: float) -> bool:
+        return bool(self.ttl) and namespace not in PERSISTENT_NAMESPACES and now - created > self.ttl
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            create_private(self.path)
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            row = self._conn().execute(
+                "SELECT value, created FROM cache WHERE key = ?", (f"{namespace}:{key}",)
+            ).fetchone()
+        except (sqlite3.Error, OSError):
+            return None
+        if row is None:
+            return None
+        value, created = row
+        if self._expired(namespace, created, time.time()):
+            return None
+        return json.loads(value)
+
+    def values(self, namespace: str) -> List[Any]:
+        """All live values in a namespace (small namespaces only, e.g. per-worker stats)."""
+        try:
+            rows = self._conn().execute(
+                "SELECT value, created FROM cache WHERE key >= ? AND key < ?",
+                (f"{namespace}:", f"{namespace};"),
+            ).fetchall()
+        except (sqlite3.Error, OSError):
+            return []
+        now = time.time()
+        return [json.loads(v) for v, created in rows if not self._expired(namespace, created, now)]
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                (f"{namespace}:{key}", json.dumps(value, default=str), time.time()),
+            )
+        except (sqlite3.Error, OSError):
+            # A cache write must never fail the analysis
+            pass
+
+
+_SHARED_CACHE: Optional[SharedCache] = None
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Process-wide cache, or None when CACHE_ENABLED is off."""
+    global _SHARED_CACHE
+    if not settings.CACHE_ENABLED:
+        return None
+    if _SHARED_CACHE is None:
+        _SHARED_CACHE = SharedCache()
+    return _SHARED_CACHE
@@ -0,0 +1,158 @@
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 1. Star-Allele Defining Variants (GRCh38)
+# Curated, versioned definitions ship as a data file (one row per defining
+# variant, with rsID); see the file header for conventions.
+
+# bp either side of a gene's defining sites in which any VCF record counts as covering the gene
+REGION_PADDING = 50_000
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "data", "star_alleles_GRCh38.tsv")
+
+
+class StarVariant(NamedTuple):
+    chrom: str
+    pos: int
+    ref: str
+    alt: str
+    gene: str
+    star: str
+    rsid: Optional[str] = None
+
+
+def read_star_table(path: str) -> Tuple[List[StarVariant], Dict[str, str]]:
+    """
+    Reads a tab-separated table: CHROM POS REF ALT GENE STAR [RSID].
+    '#key=value' lines are metadata (version, build); other '#' lines are
+    comments/header. Returns (rows, metadata).
+    """
+    rows: List[StarVariant] = []
+    meta: Dict[str, str] = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip(): continue
+            if line.startswith("#"):
+                key, sep, value = line[1:].strip().partition("=")
+                if sep and key.isidentifier():
+                    meta[key] = value
+                continue
+            parts = line.rstrip("\n").split('\t')
+            if len(parts) < 6:
+                raise ValueError(f"Malformed annotation row (expected 6 columns): {line.strip()}")
+            chrom, pos, ref, alt, gene, star = parts[:6]
+            rsid = parts[6] if len(parts) > 6 and parts[6] not in ("", ".") else None
+            rows.append(StarVariant(chrom, int(pos), ref, alt, gene, star, rsid))
+    return rows, meta
+
+
+def normalize_chrom(chrom: str) -> str:
+    """'chr22', 'CHR22' and '22' all index to the same contig."""
+    chrom = chrom.strip()
+    if chrom[:3].lower() == "chr":
+        return chrom[3:]
+    return chrom
+
+
+# 2. Position Index
+
+class StarAlleleIndex:
+    """
+    Hash index of star-allele defining variants keyed on (chrom, pos, ref, alt).
+    Lookups are O(1) per record so raw VCFs can be annotated while streaming.
+
+    A variant may define several stars (shared core SNPs); lookup() reports
+    the first row's star, definitions() lists it under all of them.
+    """
+
+    def __init__(self, variants: Iterable[Tuple], version: Optional[str] = None):
+        self.version = version
+        self._index: Dict[Tuple[str, int, str, str], Tuple[str, str]] = {}
+        self._definitions: Dict[str, Dict[str, List[Tuple[str, int, str, str]]]] = {}
+        self.rsids: Dict[str, Tuple[str, str]] = {}  # rsid -> (gene, star) of its first row
+        # Interned so million-record files share one string per gene/star
+        self._names: Dict[str, str] = {}
+        self._regions: Optional[Dict[str, List[Tuple[int, int, str]]]] = None
+        self._contigs: Dict[str, Tuple[str, Tuple[Tuple[int, int, str], ...]]] = {}
+        for chrom, pos, ref, alt, gene, star, *rest in variants:
+            key = (normalize_chrom(chrom), int(pos), ref.upper(), alt.upper())
+            gene, star = self._intern(gene), self._intern(star)
+            self._index.setdefault(key, (gene, star))
+            keys = self._definitions.setdefault(gene, {}).setdefault(star, [])
+            if key not in keys:
+                keys.append(key)
+            if rest and rest[0]:
+                self.rsids.setdefault(rest[0], (gene, star))
+
+    def _intern(self, name: str) -> str:
+        return self._names.setdefault(name, name)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def definitions(self) -> Dict[str, Dict[str, List[Tuple[str, int, str, str]]]]:
+        """Defining variant keys grouped as {gene: {star: [keys]}}."""
+        return {gene: {star: list(keys) for star, keys in stars.items()}
+                for gene, stars in self._definitions.items()}
+
+    def gene_regions(self) -> Dict[str, List[Tuple[int, int, str]]]:
+        """{chrom: [(start, end, gene)]}: each gene's defining sites, padded by REGION_PADDING."""
+        if self._regions is None:
+            spans: Dict[str, Tuple[str, int, int]] = {}
+            for (chrom, pos, _, _), (gene, _) in self._index.items():
+                _, start, end = spans.get(gene, (chrom, pos, pos))
+                spans[gene] = (chrom, min(start, pos), max(end, pos))
+            regions: Dict[str, List[Tuple[int, int, str]]] = {}
+            for gene, (chrom, start, end) in spans.items():
+                regions.setdefault(chrom, []).append((start - REGION_PADDING, end + REGION_PADDING, gene))
+            self._regions = regions
+        return self._regions
+
+    def covered_genes(self, chrom: str, pos: int) -> List[str]:
+        """Genes whose region contains the position (normalized chrom expected)."""
+        return [gene for start, end, gene in self.gene_regions().get(chrom, ()) if start <= pos <= end]
+
+    def contig(self, chrom: str) -> Tuple[str, Tuple[Tuple[int, int, str], ...]]:
+        """
+        (normalized name, gene regions) for a contig name as spelled in a VCF,
+        memoised so parsers resolve each contig once rather than per record.
+        No regions means no record on the contig can be annotated or cover a gene.
+        """
+        hit = self._contigs.get(chrom)
+        if hit is None:
+            normalized = normalize_chrom(chrom)
+            hit = self._contigs[chrom] = (normalized, tuple(self.gene_regions().get(normalized, ())))
+        return hit
+
+    def lookup(self, chrom: str, pos: int, ref: str, alt: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns (gene, star) for the first ALT allele that defines a star allele.
+        Multi-allelic ALT columns ("T,G") are checked allele by allele.
+        """
+        return self.lookup_normalized(normalize_chrom(chrom), pos, ref, alt)
+
+    def lookup_normalized(self, chrom: str, pos: int, ref: str, alt: str) -> Optional[Tuple[str, str]]:
+        """lookup() for a chrom already passed through normalize_chrom()."""
+        ref = ref.upper()
+        for allele in alt.upper().split(","):
+            hit = self._index.get((chrom, pos, ref, allele))
+            if hit:
+                return hit
+        return None
+
+    @classmethod
+    def from_table(cls, path: str) -> "StarAlleleIndex":
+        """Index over a read_star_table() file."""
+        rows, meta = read_star_table(path)
+        return cls(rows, version=meta.get("version"))
+
+
+_DEFAULT_INDEX: Optional[StarAlleleIndex] = None
+
+def get_default_index() -> StarAlleleIndex:
+    """Built-in index (DEFAULT_TABLE), constructed once per process."""
+    global _DEFAULT_INDEX
+    if _DEFAULT_INDEX is None:
+        _DEFAULT_INDEX = StarAlleleIndex.from_table(DEFAULT_TABLE)
+    return _DEFAULT_INDEX
@@ -0,0 +1,57 @@
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from pharma_guard.models.schemas import Detection
+
+# One validator call for the whole list instead of one model __init__ per row
+_DETECTION_LIST = TypeAdapter(List[Detection])
+
+
+class DetectionTable:
+    """
+    Detected (rsid, star allele) pairs held as two parallel lists.
+
+    The parser appends one row per star-allele record, so a large VCF would
+    otherwise allocate (and validate) one Pydantic Detection per row. Star
+    allele names repeat heavily and are interned, so each row costs two list
+    slots. Detection models are built once, at the response boundary, by
+    to_models(), and the same list is shared by every per-drug response.
+    """
+
+    __slots__ = ("rsids", "stars", "_models")
+
+    def __init__(self):
+        self.rsids: List[str] = []
+        self.stars: List[str] = []
+        self._models: Optional[List[Detection]] = None
+
+    def append(self, rsid: str, star_allele: str) -> None:
+        self.rsids.append(rsid)
+        self.stars.append(sys.intern(star_allele))
+        self._models = None
+
+    def __len__(self) -> int:
+        return len(self.rsids)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return zip(self.rsids, self.stars)
+
+    def to_models(self) -> List[Detection]:
+        if self._models is None:
+            self._models = _DETECTION_LIST.validate_python(
+                [{"rsid": rsid, "star_allele": star} for rsid, star in self]
+            )
+        return self._models
+
+    def to_columns(self) -> Dict[str, List[str]]:
+        """Column-oriented JSON form, for the shared cache."""
+        return {"rsid": self.rsids, "star_allele": self.stars}
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "DetectionTable":
+        table = cls()
+        for rsid, star in zip(columns["rsid"], columns["star_allele"]):
+            table.append(rsid, star)
+        return table
@@ -1,6 +1,14 @@
 import os
-from typing import List, Dict, Set
+import re
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Iterable, List, Dict, Optional, Tuple
 from pharma_guard.models.schemas import Detection, QualityMetrics
+from pharma_guard.core.star_annotation import StarAlleleIndex, get_default_index
+from pharma_guard.core.diplotype_caller import DiplotypeCall, VariantObservation, call_diplotype
+from pharma_guard.core.shared_cache import SharedCache, file_digest
+from pharma_guard.core.qc import QCAccumulator, to_int
+from pharma_guard.core.variants import DetectionTable
 
 try:
     import pysam
@@ -12,14 +20,55 @@ try:
 except ImportError:
     PYSAM_AVAILABLE = False
 
+_GT_SEP = re.compile(r'[/|]')
+
+# A VCF repeats a handful of GT strings ('0/1', '1|1', './.') millions of times
+@lru_cache(maxsize=256)
+def _gt_indices(gt: Optional[str]) -> Optional[Tuple[Optional[int], ...]]:
+    """'1/2' -> (1, 2), './1' -> (None, 1); None (no GT) stays None."""
+    if gt is None:
+        return None
+    return tuple(int(a) if a.isdecimal() else None for a in _GT_SEP.split(gt))
+
+@lru_cache(maxsize=256)
+def _genotype(gt: Optional[str]) -> Tuple[Optional[Tuple[Optional[int], ...]], bool, bool]:
+    """(allele indices, any allele called, any ALT called) of a GT string; no GT counts as both."""
+    indices = _gt_indices(gt)
+    if indices is None:
+        return None, True, True
+    return indices, any(a is not None for a in indices), any(indices)
+
+def _parse_info(info: str) -> Dict[str, str]:
+    fields = {}
+    for item in info.split(';'):
+        if '=' in item:
+            k, v = item.split('=', 1)
+            fields[k] = v
+    return fields
+
+@lru_cache(maxsize=64)
+def _format_indices(fmt: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """Positions of GT, DP and GQ in a FORMAT column (None if absent)."""
+    keys = fmt.split(':')
+    return tuple(keys.index(k) if k in keys else None for k in ("GT", "DP", "GQ"))
+
 class VCFParser:
-    def __init__(self, vcf_path: str):
+    def __init__(self, vcf_path: str, annotation_index: Optional[StarAlleleIndex] = None):
         self.vcf_path = vcf_path
+        # Used for records that lack GENE/STAR INFO tags (raw caller output)
+        self.annotation_index = annotation_index or get_default_index()
         self.quality_metrics = QualityMetrics(vcf_parsing_success=False, gene_detected=False)
+        # Full per-gene calls (score + ambiguity flag), filled by parse()
+        self.diplotype_calls: Dict[str, DiplotypeCall] = {}
+        # Collected in the same pass as genotypes and QC
+        self._detections: Optional[DetectionTable] = None
+        # First sample column of the #CHROM header, if any
+        self.sample_id: Optional[str] = None
 
     def parse(self) -> Dict[str, List[str]]:
         """
-        Parses VCF and extracts STAR alleles per gene.
+        Parses VCF and extracts STAR alleles per gene in a single streaming
+        pass, collecting detections and QC metrics along the way.
         Returns: { "CYP2D6": ["*1", "*4"], ... }
         """
         if PYSAM_AVAILABLE:
@@ -27,114 +76,260 @@ class VCFParser:
         else:
             return self._parse_simple()
 
+    def parse_lines(self, lines: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        parse() over already-open VCF text, e.g. a member streamed out of an
+        archive. Always uses the pure-Python parser; vcf_path is only a label.
+        """
+        return self._parse_simple(lines)
+
+    def get_detection_table(self) -> DetectionTable:
+        """Detections in their compact column form; what the pipeline consumes."""
+        if self._detections is None:
+            self.parse()
+        return self._detections
+
     def get_detections(self) -> List[Detection]:
-        if PYSAM_AVAILABLE:
-            return self._get_detections_pysam()
-        else:
-            return self._get_detections_simple()
+        """Detections as Pydantic models (the pre-DetectionTable return type)."""
+        return self.get_detection_table().to_models()
 
     def _parse_pysam(self) -> Dict[str, List[str]]:
-        gene_alleles: Dict[str, Set[str]] = {}
+        gene_observations: Dict[str, List[VariantObservation]] = {}
+        self._detections = DetectionTable()
+        gene_detected = False
+        covered: set = set()
+        qc = QCAccumulator()
         try:
             save = pysam.set_verbosity(0)
             vcf = pysam.VariantFile(self.vcf_path)
             pysam.set_verbosity(save)
+            self.sample_id = next(iter(vcf.header.samples), None)
             
             self.quality_metrics.vcf_parsing_success = True
             
             for record in vcf:
-                if "GENE" in record.info and "STAR" in record.info:
-                    gene = record.info["GENE"][0] if isinstance(record.info["GENE"], tuple) else record.info["GENE"]
-                    star = record.info["STAR"][0] if isinstance(record.info["STAR"], tuple) else record.info["STAR"]
-                    
-                    if gene not in gene_alleles:
-                        gene_alleles[gene] = set()
-                    gene_alleles[gene].add(star)
-                    self.quality_metrics.gene_detected = True
+                rsid = record.id or "."
+                chrom, regions = self.annotation_index.contig(record.chrom)
+                hit = self._star_from_pysam(record, chrom, regions)
+                sample = record.samples[0] if record.samples else None
+                fmt = record.format
+                gt = tuple(sample["GT"] or ()) if sample is not None and "GT" in fmt else None
+
+                if hit:
+                    gene_detected = True
+                observed = self._observe(gene_observations, chrom, record.pos, record.ref,
+                                         record.alts or (), gt, hit) if hit else []
+                # 0/0 reference calls are not detections
+                if "STAR" in record.info:
+                    if self._alt_count_pysam(record) > 0:
+                        star = record.info["STAR"]
+                        self._detections.append(rsid, star[0] if isinstance(star, tuple) else star)
+                else:
+                    for star in observed:
+                        self._detections.append(rsid, star)
+
+                depth = to_int(sample["DP"]) if sample is not None and "DP" in fmt else None
+                if depth is None and "DP" in record.info:
+                    depth = to_int(record.info["DP"])
+                gq = to_int(sample["GQ"]) if sample is not None and "GQ" in fmt else None
+                called = not (sample is not None and "GT" in fmt and all(a is None for a in (sample["GT"] or (None,))))
+                qc.add(";".join(record.filter.keys()), hit[0] if hit else None, record.chrom, record.pos, rsid,
+                       called, depth, gq)
+                self._cover(covered, regions, record.pos, hit)
             vcf.close()
-            return self._construct_diplotypes(gene_alleles)
+            self.quality_metrics.gene_detected = gene_detected
+            qc.fill(self.quality_metrics)
+            return self._construct_diplotypes(gene_observations, covered)
         except Exception:
             self.quality_metrics.vcf_parsing_success = False
             return {}
 
-    def _parse_simple(self) -> Dict[str, List[str]]:
+    def _parse_simple(self, lines: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
         """Fallback simple parser for Windows/No-Pysam"""
-        gene_alleles: Dict[str, Set[str]] = {}
+        gene_observations: Dict[str, List[VariantObservation]] = {}
+        self._detections = DetectionTable()
+        gene_detected = False
+        covered: set = set()
+        qc = QCAccumulator()
+        contig = self.annotation_index.contig
         try:
-            with open(self.vcf_path, 'r') as f:
+            with open(self.vcf_path, 'r') if lines is None else nullcontext(lines) as f:
                 for line in f:
-                    if line.startswith("#"): continue
+                    if line.startswith("#"):
+                        if line.startswith("#CHROM"):
+                            header = line.rstrip("\r\n").split('\t')
+                            self.sample_id = header[9] if len(header) > 9 else None
+                        continue
                     parts = line.strip().split('\t')
                     if len(parts) < 8: continue
-                    
-                    # INFO field is normally at index 7
+
+                    chrom, regions = contig(parts[0])
+                    try:
+                        pos = int(parts[1])
+                    except ValueError:
+                        pos = 0
+                    rsid = parts[2]
+
+                    # INFO is only split when it can carry tags we read
                     info_str = parts[7]
-                    info_dict = {}
-                    for item in info_str.split(';'):
-                        if '=' in item:
-                            k, v = item.split('=', 1)
-                            info_dict[k] = v
-                    
-                    if "GENE" in info_dict and "STAR" in info_dict:
-                        gene = info_dict["GENE"]
-                        star = info_dict["STAR"]
-                        
-                        if gene not in gene_alleles:
-                            gene_alleles[gene] = set()
-                        gene_alleles[gene].add(star)
-                        self.quality_metrics.gene_detected = True
-                        
+                    info = _parse_info(info_str) if "GENE=" in info_str or "STAR=" in info_str else None
+                    if info is not None and "GENE" in info and "STAR" in info:
+                        hit = (info["GENE"], info["STAR"], True)
+                    elif regions and pos:
+                        # Contigs without target genes skip the index entirely
+                        allele_hit = self.annotation_index.lookup_normalized(chrom, pos, parts[3], parts[4])
+                        hit = (allele_hit[0], allele_hit[1], False) if allele_hit else None
+                    else:
+                        hit = None
+
+                    # FORMAT + first sample column, if present
+                    gt = dp = gq = None
+                    if len(parts) >= 10:
+                        gt_i, dp_i, gq_i = _format_indices(parts[8])
+                        values = parts[9].split(':')
+                        n = len(values)
+                        gt = values[gt_i] if gt_i is not None and gt_i < n else None
+                        dp = values[dp_i] if dp_i is not None and dp_i < n else None
+                        gq = values[gq_i] if gq_i is not None and gq_i < n else None
+                    if dp is None and "DP=" in info_str:
+                        # Sample has no DP: fall back to INFO DP
+                        dp = (info if info is not None else _parse_info(info_str)).get("DP")
+                    gt_indices, called, alt_called = _genotype(gt)
+                    qc.add(parts[6], hit[0] if hit else None, parts[0], pos, rsid, called, dp, gq)
+                    if regions or hit:
+                        self._cover(covered, regions, pos, hit)
+
+                    if not hit:
+                        continue
+                    gene_detected = True
+                    observed = self._observe(gene_observations, chrom, pos, parts[3], parts[4].split(','),
+                                             gt_indices, hit)
+                    # 0/0 reference calls are not detections
+                    if info is not None and "STAR" in info:
+                        if alt_called:
+                            self._detections.append(rsid, info["STAR"])
+                    else:
+                        for star in observed:
+                            self._detections.append(rsid, star)
+
             self.quality_metrics.vcf_parsing_success = True
-            return self._construct_diplotypes(gene_alleles)
+            self.quality_metrics.gene_detected = gene_detected
+            qc.fill(self.quality_metrics)
+            return self._construct_diplotypes(gene_observations, covered)
         except Exception:
             self.quality_metrics.vcf_parsing_success = False
             return {}
 
-    def _get_detections_pysam(self) -> List[Detection]:
-        detections = []
-        try:
-            vcf = pysam.VariantFile(self.vcf_path)
-            for record in vcf:
-                if "STAR" in record.info:
-                    star = record.info["STAR"]
-                    star_val = star[0] if isinstance(star, tuple) else star
-                    detections.append(Detection(rsid=record.id or ".", star_allele=star_val))
-            vcf.close()
-        except: pass
-        return detections
+    def _cover(self, covered: set, regions: Tuple[Tuple[int, int, str], ...], pos: int,
+               hit: Optional[Tuple[str, str, bool]]) -> None:
+        """
+        Genes this record shows the VCF looked at: its tag/index gene, or any
+        gene region (from StarAlleleIndex.contig()) it falls in.
+        """
+        if hit:
+            covered.add(hit[0])
+        for start, end, gene in regions:
+            if start <= pos <= end:
+                covered.add(gene)
 
-    def _get_detections_simple(self) -> List[Detection]:
-        detections = []
-        try:
-            with open(self.vcf_path, 'r') as f:
-                for line in f:
-                    if line.startswith("#"): continue
-                    parts = line.strip().split('\t')
-                    if len(parts) < 8: continue
-                    
-                    rsid = parts[2]
-                    info_str = parts[7]
-                    for item in info_str.split(';'):
-                        if item.startswith("STAR="):
-                            star_val = item.split('=', 1)[1]
-                            detections.append(Detection(rsid=rsid, star_allele=star_val))
-        except: pass
-        return detections
-
-    def _construct_diplotypes(self, gene_alleles: Dict[str, Set[str]]) -> Dict[str, List[str]]:
+    def _star_from_pysam(self, record, chrom: str,
+                         regions: Tuple[Tuple[int, int, str], ...]) -> Optional[Tuple[str, str, bool]]:
+        """(gene, star, tagged) from INFO tags, falling back to the position index."""
+        if "GENE" in record.info and "STAR" in record.info:
+            gene = record.info["GENE"][0] if isinstance(record.info["GENE"], tuple) else record.info["GENE"]
+            star = record.info["STAR"][0] if isinstance(record.info["STAR"], tuple) else record.info["STAR"]
+            return gene, star, True
+        if not record.alts or not regions:
+            return None
+        hit = self.annotation_index.lookup_normalized(chrom, record.pos, record.ref, ",".join(record.alts))
+        return (hit[0], hit[1], False) if hit else None
+
+    def _observe(self, gene_observations: Dict[str, List[VariantObservation]], chrom: str, pos: int,
+                 ref: str, alts: Iterable[str], gt: Optional[Tuple[Optional[int], ...]],
+                 hit: Tuple[str, str, bool]) -> List[str]:
+        """
+        Adds one observation per called ALT allele of a record, keyed on that
+        allele alone so multi-allelic sites match per-allele definitions and
+        a call of a non-defining ALT is not counted. gt holds the first
+        sample's allele indices (None = no-call), or is None for sites-only
+        VCFs (ALT 1 counted once); chrom is already normalized. Returns the
+        observed stars.
+        """
+        gene, star, tagged = hit
+        gt = (0, 1) if gt is None else gt
+        ref = ref.upper()
+        stars = []
+        for i, alt in enumerate(alts, start=1):
+            count = gt.count(i)
+            if count == 0: continue
+            alt = alt.upper()
+            if not tagged:
+                allele_hit = self.annotation_index.lookup_normalized(chrom, pos, ref, alt)
+                if allele_hit is None: continue
+                gene, star = allele_hit
+            gene_observations.setdefault(gene, []).append(VariantObservation((chrom, pos, ref, alt), star, count, tagged))
+            stars.append(star)
+        return stars
+
+    def _alt_count_pysam(self, record) -> int:
+        """Non-reference alleles in the first sample's GT; sites-only VCFs count as 1."""
+        if not record.samples or "GT" not in record.format:
+            return 1
+        gt = record.samples[0]["GT"] or ()
+        return sum(1 for a in gt if a)
+
+    def _construct_diplotypes(self, gene_observations: Dict[str, List[VariantObservation]],
+                              covered: set) -> Dict[str, List[str]]:
+        """
+        Calls every target gene the VCF covers. Genes with no record in their
+        region are left out (phenotype Unknown downstream) rather than assumed
+        *1/*1: a panel without chr16 says nothing about VKORC1.
+        """
         final_diplotypes = {}
-        target_genes = ["CYP2D6", "CYP2C19", "CYP2C9", "SLCO1B1", "TPMT", "DPYD"]
+        target_genes = ["CYP2D6", "CYP2C19", "CYP2C9", "SLCO1B1", "TPMT", "DPYD", "VKORC1", "CYP4F2"]
         
         for gene in target_genes:
-            alleles = sorted(list(gene_alleles.get(gene, [])))
-            
-            if len(alleles) == 0:
-                final_diplotypes[gene] = ["*1", "*1"]
-            elif len(alleles) == 1:
-                final_diplotypes[gene] = [alleles[0], "*1"]
-            elif len(alleles) == 2:
-                final_diplotypes[gene] = alleles
-            else:
-                final_diplotypes[gene] = alleles[:2]
+            if gene not in covered: continue
+            call = call_diplotype(gene, gene_observations.get(gene, []), self.annotation_index)
+            self.diplotype_calls[gene] = call
+            final_diplotypes[gene] = call.alleles
+
+        self.quality_metrics.ambiguous_diplotypes = [g for g, c in self.diplotype_calls.items() if c.ambiguous]
                 
         return final_diplotypes
+
+
+# Bumped when the cached profile layout or calling changes (v2: column-oriented
+# detections, v3: VKORC1/CYP4F2, v4: curated GRCh38 table, ambiguity flags,
+# v5: uncovered genes left uncalled)
+PROFILE_NAMESPACE = "profile.v5"
+
+def parse_vcf_profile(vcf_path: str,
+                      cache: Optional[SharedCache] = None,
+                      digest: Optional[str] = None) -> Tuple[Dict[str, List[str]], DetectionTable, QualityMetrics]:
+    """
+    parse() + get_detection_table() (one pass) for the built-in annotation index,
+    memoized in the shared cache by file content so every server worker
+    reuses the result. Pass `digest` if the caller already hashed the file.
+    """
+    key = (digest or file_digest(vcf_path)) if cache else None
+    if cache:
+        hit = cache.get(PROFILE_NAMESPACE, key)
+        if hit is not None:
+            return (
+                hit["genotypes"],
+                DetectionTable.from_columns(hit["detections"]),
+                QualityMetrics(**hit["quality_metrics"]),
+            )
+
+    vcf_parser = VCFParser(vcf_path)
+    genotypes = vcf_parser.parse()
+    detections = vcf_parser.get_detection_table()
+
+    if cache and vcf_parser.quality_metrics.vcf_parsing_success:
+        cache.set(PROFILE_NAMESPACE, key, {
+            "genotypes": genotypes,
+            "detections": detections.to_columns(),
+            "quality_metrics": vcf_parser.quality_metrics.model_dump(),
+        })
+    return genotypes, detections, vcf_parser.quality_metrics
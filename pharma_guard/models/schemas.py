@@ -23,17 +23,31 @@ class Phenotype(str, Enum):
     NM = "NM"  # Normal Metabolizer
     RM = "RM"  # Rapid Metabolizer
     URM = "URM" # Ultra-Rapid Metabolizer
+    # VKORC1 is a drug target, not an enzyme: -1639A lowers expression and raises warfarin sensitivity
+    NORMAL_SENSITIVITY = "Normal Sensitivity"
+    INCREASED_SENSITIVITY = "Increased Sensitivity"
+    HIGH_SENSITIVITY = "High Sensitivity"
     UNKNOWN = "Unknown"
 
 class Detection(BaseModel):
     rsid: str
     star_allele: str
 
+class GeneCall(BaseModel):
+    gene: str
+    diplotype: str = Field(..., example="*1/*2")
+    phenotype: Phenotype
+    diplotype_ambiguous: bool = False
+
 class PharmacogenomicProfile(BaseModel):
     primary_gene: str
     diplotype: str = Field(..., example="*1/*4")
     phenotype: Phenotype
     detected_variants: List[Detection]
+    # Another diplotype explains the observed variants equally well (e.g. unphased *3B + *3C)
+    diplotype_ambiguous: bool = False
+    # Other genes read by a multi-gene rule (e.g. VKORC1, CYP4F2 for warfarin)
+    secondary_genes: List[GeneCall] = Field(default_factory=list)
 
 class RiskAssessment(BaseModel):
     risk_label: RiskLabel
@@ -50,9 +64,39 @@ class LLMExplanation(BaseModel):
     clinical_implication: str
     dosing_rationale: str
 
+class DistributionStats(BaseModel):
+    count: int = 0
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    histogram: Dict[str, int] = {}  # bin label ("20-29", "100+") -> records
+
+class GeneQC(BaseModel):
+    sites: int           # Pharmacogene records seen for this gene
+    called: int          # ...with a non-missing GT
+    call_rate: float
+    low_coverage_sites: int
+
+class LowCoverageSite(BaseModel):
+    gene: str
+    chrom: str
+    pos: int
+    rsid: str
+    depth: int
+
 class QualityMetrics(BaseModel):
     vcf_parsing_success: bool
     gene_detected: bool
+    # Accumulated during the single parse pass
+    total_records: int = 0
+    filter_pass: int = 0
+    filter_fail: int = 0
+    filter_counts: Dict[str, int] = {}  # FILTER value -> records
+    depth: Optional[DistributionStats] = None
+    genotype_quality: Optional[DistributionStats] = None
+    gene_qc: Dict[str, GeneQC] = {}
+    low_coverage_sites: List[LowCoverageSite] = []  # Capped at QC_MAX_FLAGGED_SITES
+    ambiguous_diplotypes: List[str] = []  # Genes whose diplotype call tied with another pair
 
 class AnalysisResponse(BaseModel):
     patient_id: str
@@ -64,6 +108,11 @@ class AnalysisResponse(BaseModel):
     llm_generated_explanation: LLMExplanation
     quality_metrics: QualityMetrics
 
+class CohortStatsResponse(BaseModel):
+    patients_analyzed: int
+    phenotype_distribution: Dict[str, Dict[str, int]]  # gene -> phenotype -> count
+    risk_distribution: Dict[str, Dict[str, int]]       # drug -> risk label -> count
+
 class AnalysisRequest(BaseModel):
     # Depending on how file upload is handled, this might not be used directly in body
     # but drug name is. File will be form-data
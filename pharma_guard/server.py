@@ -0,0 +1,168 @@
+"""
+Prefork server entry point.
+
+    python -m pharma_guard.server --host 0.0.0.0 --port 8000 --workers 4
+
+The app, CPIC rule tables, star-allele index and haplotype bitsets are loaded
+once in the parent, then N workers are forked onto a shared listening socket.
+Workers inherit those read-only structures copy-on-write instead of each
+building its own copy; per-request caches live in the SQLite-backed
+SharedCache so hits are shared between workers too.
+"""
+import argparse
+import gc
+import math
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+from pharma_guard.core.config import settings
+
+
+def preload():
+    """Imports and builds everything workers only ever read."""
+    from pharma_guard.core import cpic_logic  # noqa: F401  (rule tables)
+    from pharma_guard.core.star_annotation import get_default_index
+    from pharma_guard.core.diplotype_caller import get_haplotypes
+    from backend.main import app
+
+    get_haplotypes(get_default_index())
+    # Keep the preloaded objects out of GC passes so workers don't dirty
+    # (and thereby copy) their pages just by updating GC headers.
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    return app
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: the scheduler affinity mask, further
+    limited by a cgroup CPU quota (containers, Render/Docker limits), which
+    os.cpu_count() ignores.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:  # cgroup v1
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(app, sock, log_level)
+        except BaseException:
+            code = 1
+        os._exit(code)
+    return pid
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info"):
+    app = preload()
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        # Windows / single worker: plain uvicorn in this process
+        import uvicorn
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    # The Groq rate limit is per account: split it between the workers
+    from pharma_guard.core.llm_scheduler import llm_scheduler
+    llm_scheduler.set_worker_count(workers)
+
+    sock = _bind(host, port)
+    children: Dict[int, int] = {}  # pid -> worker slot
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    for slot in range(workers):
+        children[_spawn(app, sock, log_level)] = slot
+    print(f"PharmaGuard: {workers} workers on {host}:{port} (parent pid {os.getpid()})", file=sys.stderr)
+
+    # Supervise: replace workers that die unexpectedly
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"PharmaGuard: worker {pid} exited, restarting", file=sys.stderr)
+            time.sleep(0.5)
+            children[_spawn(app, sock, log_level)] = slot
+
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PharmaGuard prefork API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="Worker processes (0 = one per available CPU)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    workers = args.workers or min(available_cpus(), settings.SERVER_MAX_AUTO_WORKERS)
+    serve(args.host, args.port, workers, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+import os
+from datetime import datetime
+
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.models.schemas import (
+    AnalysisResponse, RiskAssessment, PharmacogenomicProfile, ClinicalRecommendation,
+    LLMExplanation, QualityMetrics, Detection, Phenotype, RiskLabel, Severity
+)
+
+@pytest.fixture
+def make_response():
+    """Factory for a stored-result-shaped AnalysisResponse (CYP2C9 *3/*3, PM, Toxic)."""
+    def _make(patient_id, drug):
+        return AnalysisResponse(
+            patient_id=patient_id,
+            drug=drug,
+            timestamp=datetime(2026, 1, 1, 12, 0, 0),
+            risk_assessment=RiskAssessment(risk_label=RiskLabel.TOXIC, confidence_score=0.95, severity=Severity.HIGH),
+            pharmacogenomic_profile=PharmacogenomicProfile(
+                primary_gene="CYP2C9", diplotype="*3/*3", phenotype=Phenotype.PM,
+                detected_variants=[Detection(rsid="rs1057910", star_allele="*3")]
+            ),
+            clinical_recommendation=ClinicalRecommendation(action="Avoid warfarin."),
+            llm_generated_explanation=LLMExplanation(
+                summary="s", biological_mechanism="b", clinical_implication="c", dosing_rationale="d"
+            ),
+            quality_metrics=QualityMetrics(vcf_parsing_success=True, gene_detected=True)
+        )
+    return _make
+
+class StubLLM:
+    """Offline stand-in for LLMService: fixed explanation and recommendation text."""
+    def generate_explanation(self, **kwargs):
+        return LLMExplanation(summary="s", biological_mechanism="m", clinical_implication="c", dosing_rationale="d")
+
+    def generate_clinical_recommendation(self, **kwargs):
+        return "r"
+
+@pytest.fixture
+def stub_llm():
+    return StubLLM()
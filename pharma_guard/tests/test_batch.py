@@ -0,0 +1,75 @@
+import sys
+import os
+import io
+import json
+import tarfile
+import zipfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.batch import analyze_batch, iter_vcf_members, outcome_line
+
+VCF = (
+    "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tNA12878\n"
+    "chr10\t94781859\trs4244285\tG\tA\t99\tPASS\t.\tGT:DP\t1/1:40\n"
+).encode()
+
+def _tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+def _zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+def test_members_streamed_from_archives():
+    members = [("cohort/P1.vcf", VCF), ("cohort/README.txt", b"notes"), ("__MACOSX/._P1.vcf", b"\x00")]
+    for name, archive in [("cohort.tar.gz", _tar(members)), ("cohort.zip", _zip(members))]:
+        found = [(member, "".join(lines)) for member, lines in iter_vcf_members(name, archive)]
+        assert found == [("cohort/P1.vcf", VCF.decode())]
+
+def test_batch_outcomes_in_input_order(stub_llm):
+    uploads = [
+        ("cohort.tar.gz", _tar([("a/P1.vcf", VCF), ("a/P2.vcf", VCF)])),
+        ("P3.vcf", io.BytesIO(VCF)),
+        ("broken.zip", io.BytesIO(b"PK\x03\x04 not really a zip")),
+    ]
+    outcomes = list(analyze_batch(uploads, ["Clopidogrel"], stub_llm, workers=1))
+
+    assert [o.patient_id for o in outcomes] == ["P1", "P2", "P3", "broken.zip"]
+    assert outcomes[0].results[0].pharmacogenomic_profile.diplotype == "*2/*2"
+    assert outcomes[0].results[0].patient_id == "P1"
+    assert outcomes[-1].error.startswith("Archive could not be read")
+
+    line = json.loads(outcome_line(outcomes[0]))
+    assert line["source"] == "a/P1.vcf" and line["results"][0]["drug"] == "Clopidogrel"
+
+def test_patient_id_from_sample(stub_llm):
+    outcomes = list(analyze_batch([("P1.vcf", io.BytesIO(VCF))], ["Clopidogrel"], stub_llm,
+                                  patient_id_source="sample"))
+    assert outcomes[0].patient_id == "NA12878"
+
+def test_ambiguous_diplotype_in_response(stub_llm):
+    # TPMT *3B + *3C unphased: *3A/*1 or *3B/*3C
+    vcf = (
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+        "chr6\t18130687\trs1142345\tT\tC\t99\tPASS\t.\tGT\t0/1\n"
+        "chr6\t18138997\trs1800460\tC\tT\t99\tPASS\t.\tGT\t0/1\n"
+    ).encode()
+    outcome = next(analyze_batch([("P1.vcf", io.BytesIO(vcf))], ["Azathioprine", "Clopidogrel"], stub_llm, workers=1))
+    profiles = {r.drug: r.pharmacogenomic_profile for r in outcome.results}
+    assert profiles["Azathioprine"].diplotype == "*3A/*1"
+    assert profiles["Azathioprine"].diplotype_ambiguous
+    assert not profiles["Clopidogrel"].diplotype_ambiguous
+    assert json.loads(outcome_line(outcome))["results"][0]["pharmacogenomic_profile"]["diplotype_ambiguous"]
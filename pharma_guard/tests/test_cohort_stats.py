@@ -0,0 +1,55 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.cohort_stats import CohortAggregator
+from pharma_guard.core.shared_cache import SharedCache
+from pharma_guard.models.schemas import Phenotype, RiskLabel
+
+def test_record_and_merge():
+    a = CohortAggregator()
+    a.record({"CYP2D6": Phenotype.PM}, {"Codeine": RiskLabel.INEFFECTIVE})
+    a.record({"CYP2D6": Phenotype.NM}, {"codeine": RiskLabel.SAFE})
+
+    b = CohortAggregator()
+    b.record({"CYP2D6": Phenotype.PM, "CYP2C9": Phenotype.IM}, {"WARFARIN": RiskLabel.ADJUST_DOSAGE})
+
+    stats = (a + b).to_dict()
+    assert stats["patients_analyzed"] == 3
+    assert stats["phenotype_distribution"]["CYP2D6"] == {"PM": 2, "NM": 1}
+    assert stats["risk_distribution"]["CODEINE"] == {"Ineffective": 1, "Safe": 1}
+    assert stats["risk_distribution"]["WARFARIN"] == {"Adjust Dosage": 1}
+
+    # Partial aggregates survive a serialization round trip
+    restored = CohortAggregator.from_dict(stats)
+    assert restored.to_dict() == stats
+
+def test_publish_and_collect_across_workers(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite3"))
+
+    worker_a, worker_b = CohortAggregator(), CohortAggregator()
+    # Pretend worker_b is another process
+    worker_b._worker_id, worker_b._worker_pid = "other-worker", os.getpid()
+    worker_a.record({"TPMT": Phenotype.PM}, {"AZATHIOPRINE": RiskLabel.TOXIC})
+    worker_b.record({"TPMT": Phenotype.NM}, {"AZATHIOPRINE": RiskLabel.SAFE})
+    worker_a.publish(cache)
+    worker_b.publish(cache)
+
+    stats = CohortAggregator.collect(cache).to_dict()
+    assert stats["patients_analyzed"] == 2
+    assert stats["phenotype_distribution"]["TPMT"] == {"PM": 1, "NM": 1}
+
+def test_cache_file_private_and_cohort_never_expires(tmp_path):
+    path = tmp_path / "private" / "cache.sqlite3"
+    cache = SharedCache(path=str(path), ttl=60)
+    cache.set("cohort", "worker-1", {"patients_analyzed": 4})
+    cache.set("llm", "prompt", "answer")
+    assert (path.stat().st_mode & 0o777) == 0o600
+    assert (path.parent.stat().st_mode & 0o777) == 0o700
+
+    # Age every entry past the TTL: cached answers expire, cohort counts stay
+    cache._conn().execute("UPDATE cache SET created = created - 3600")
+    assert cache.get("llm", "prompt") is None
+    assert cache.values("cohort") == [{"patients_analyzed": 4}]
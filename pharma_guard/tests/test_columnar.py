@@ -0,0 +1,54 @@
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from pharma_guard.core.columnar import columnar_chunks, columnar_paths, write_columnar
+
+@pytest.fixture
+def records(make_response):
+    # Two patients x two drugs; model_dump() and stored-JSON shaped records
+    records = []
+    for i, (patient, drug) in enumerate([("P1", "Warfarin"), ("P1", "Codeine"), ("P2", "Warfarin"), ("P2", "Codeine")]):
+        response = make_response(patient, drug)
+        record = response.model_dump() if i % 2 else json.loads(response.model_dump_json())
+        records.append((i + 1, record))
+    return records
+
+def test_parquet_tables(tmp_path, records):
+    risks_path, detections_path = columnar_paths(str(tmp_path / "cohort.parquet"), "parquet")
+    assert risks_path.endswith("cohort.risks.parquet")
+
+    counts = write_columnar(iter(records), "parquet", risks_path, detections_path, batch_size=3)
+    assert counts == {"risks": 4, "detections": 2}
+    assert pq.ParquetFile(risks_path).num_row_groups == 2  # Flushed in record batches
+
+    risks = pq.read_table(risks_path)
+    assert pa.types.is_dictionary(risks.schema.field("risk_label").type)
+    rows = risks.to_pylist()
+    assert [(r["patient_id"], r["drug"], r["risk_label"], r["phenotype"]) for r in rows[:2]] == [
+        ("P1", "Warfarin", "Toxic", "PM"), ("P1", "Codeine", "Toxic", "PM")]
+    assert [r["detections_cursor"] for r in rows] == [1, 1, 3, 3]
+
+    detections = pq.read_table(detections_path).to_pylist()
+    assert detections == [
+        {"export_cursor": 1, "patient_id": "P1", "rsid": "rs1057910", "star_allele": "*3"},
+        {"export_cursor": 3, "patient_id": "P2", "rsid": "rs1057910", "star_allele": "*3"},
+    ]
+
+def test_streamed_chunks(records):
+    data = b"".join(columnar_chunks(iter(records), "parquet", "risks", batch_size=2))
+    assert pq.read_table(pa.BufferReader(data)).num_rows == 4
+
+    data = b"".join(columnar_chunks(iter(records), "arrow", "detections"))
+    assert pa.ipc.open_stream(data).read_all().num_rows == 2
+
+    empty = b"".join(columnar_chunks(iter([]), "parquet", "risks"))
+    assert pq.read_table(pa.BufferReader(empty)).num_rows == 0
@@ -10,6 +10,8 @@ from pharma_guard.core.cpic_logic import (
     get_phenotype_cyp2c19,
     get_phenotype_cyp2c9,
     analyze_risk,
+    evaluate_panel,
+    RULE_INDEX,
     CYP2D6_ACTIVITY,
     DRUG_RISK_MAP
 )
@@ -50,12 +52,55 @@ def test_risk_logic_warfarin():
     risk, sev, conf, gene = analyze_risk("Warfarin", phenotypes)
     assert risk == RiskLabel.SAFE
 
+def test_risk_logic_warfarin_multi_gene():
+    # CYP2C9 IM alone -> Adjust; with VKORC1 -1639AA (high sensitivity) -> Toxic
+    normal = Phenotype.NORMAL_SENSITIVITY
+    risk, sev, conf, gene = analyze_risk("Warfarin", {"CYP2C9": Phenotype.IM, "VKORC1": normal, "CYP4F2": Phenotype.NM})
+    assert (risk, sev, conf, gene) == (RiskLabel.ADJUST_DOSAGE, Severity.MODERATE, 0.95, "CYP2C9")
+    risk, sev, conf, gene = analyze_risk("Warfarin", {"CYP2C9": Phenotype.IM, "VKORC1": Phenotype.HIGH_SENSITIVITY, "CYP4F2": Phenotype.NM})
+    assert (risk, sev) == (RiskLabel.TOXIC, Severity.HIGH)
+
+    # Normal CYP2C9 with a reduced-function CYP4F2 still needs a dose change
+    risk, sev, conf, gene = analyze_risk("Warfarin", {"CYP2C9": Phenotype.NM, "VKORC1": normal, "CYP4F2": Phenotype.PM})
+    assert (risk, sev) == (RiskLabel.ADJUST_DOSAGE, Severity.LOW)
+
+    # Secondary genes not called: matched on CYP2C9 alone, lower confidence
+    risk, sev, conf, gene = analyze_risk("Warfarin", {"CYP2C9": Phenotype.PM})
+    assert (risk, conf) == (RiskLabel.TOXIC, 0.8)
+    # Primary gene not called: Unknown
+    risk, sev, conf, gene = analyze_risk("Warfarin", {"VKORC1": Phenotype.HIGH_SENSITIVITY})
+    assert (risk, conf) == (RiskLabel.UNKNOWN, 0.0)
+
+def test_panel_evaluation():
+    assert "WARFARIN" in RULE_INDEX.by_gene["VKORC1"]
+    assert RULE_INDEX.rules["WARFARIN"].genes == ("CYP2C9", "VKORC1", "CYP4F2")
+
+    phenotypes = {"CYP2D6": Phenotype.PM, "CYP2C9": Phenotype.NM, "VKORC1": Phenotype.INCREASED_SENSITIVITY}
+    calls = evaluate_panel(phenotypes)
+    # Only drugs whose genes were called are touched
+    assert set(calls) == {"CODEINE", "WARFARIN"}
+    assert calls["WARFARIN"].risk_label == RiskLabel.ADJUST_DOSAGE
+    for drug, call in calls.items():
+        assert call == analyze_risk(drug, phenotypes)
+
+    assert set(evaluate_panel(phenotypes, ["warfarin", "Clopidogrel"])) == {"WARFARIN"}
+
+def test_vkorc1_sensitivity_labels():
+    from pharma_guard.core.cpic_logic import get_phenotype_vkorc1
+    assert get_phenotype_vkorc1(["*1", "*1"]) == Phenotype.NORMAL_SENSITIVITY
+    assert get_phenotype_vkorc1(["*2", "*1"]) == Phenotype.INCREASED_SENSITIVITY
+    assert get_phenotype_vkorc1(["*2", "*2"]) == Phenotype.HIGH_SENSITIVITY
+    assert "GENE" not in DRUG_RISK_MAP["DATA"]["WARFARIN"]  # GENES[0] is the primary gene
+
 if __name__ == "__main__":
     try:
         test_cyp2d6_scoring()
         test_cyp2c19_phenotype()
         test_risk_logic_codeine()
         test_risk_logic_warfarin()
+        test_risk_logic_warfarin_multi_gene()
+        test_panel_evaluation()
+        test_vkorc1_sensitivity_labels()
         print("ALL TESTS PASSED")
     except AssertionError as e:
         print(f"TEST FAILED: {e}")
@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.diplotype_caller import GeneHaplotypes, VariantObservation, call_diplotype, haplotypes_for
+
+def test_bitset_pair_scoring():
+    table = GeneHaplotypes({"*4": ["a", "b"], "*10": ["c"], "*41": ["a", "d"]})
+    bits = table.bits
+
+    call = table.call(bits["a"] | bits["b"] | bits["c"])
+    assert call.alleles == ["*10", "*4"]
+    assert call.score == 0
+    assert not call.ambiguous
+
+    # Homozygous *4 needs both haplotypes to carry a and b
+    call = table.call(bits["a"] | bits["b"], homozygous=bits["a"] | bits["b"])
+    assert call.alleles == ["*4", "*4"]
+
+def test_ambiguous_when_tied():
+    table = GeneHaplotypes({"*4": ["a", "b"], "*41": ["a", "d"]})
+    call = table.call(table.bits["a"])
+    assert call.ambiguous
+
+def test_more_than_two_tagged_alleles():
+    # Previously alleles[:2] of the sorted set silently dropped the third star
+    observations = [
+        VariantObservation(("22", 1, "C", "T"), "*4", 1, True),
+        VariantObservation(("22", 2, "G", "A"), "*4", 1, True),
+        VariantObservation(("22", 3, "G", "A"), "*4", 1, True),
+        VariantObservation(("22", 4, "C", "T"), "*17", 1, True),
+        VariantObservation(("22", 5, "C", "T"), "*10", 1, True),
+    ]
+    call = call_diplotype("CYP2D6", observations)
+    assert "*4" in call.alleles
+    assert call.ambiguous
+
+def test_positional_calls_use_index_definitions():
+    # CYP2D6 *4 = rs3892097 + rs1065852; *10 = rs1065852 alone
+    observations = [
+        VariantObservation(("22", 42128945, "C", "T"), "*4", 2, False),
+        VariantObservation(("22", 42130692, "G", "A"), "*10", 2, False),
+    ]
+    call = call_diplotype("CYP2D6", observations)
+    assert call.alleles == ["*4", "*4"]
+    assert call.score == 0
+
+    observations = [
+        VariantObservation(("22", 42128945, "C", "T"), "*4", 1, False),
+        VariantObservation(("22", 42130692, "G", "A"), "*10", 1, False),
+    ]
+    assert call_diplotype("CYP2D6", observations).alleles == ["*4", "*1"]
+
+def test_variant_only_vcf_missing_core_site():
+    # rs3892097 alone (rs1065852 not listed): still *4, not reference
+    observations = [VariantObservation(("22", 42128945, "C", "T"), "*4", 2, False)]
+    assert call_diplotype("CYP2D6", observations).alleles == ["*4", "*4"]
+
+def test_shared_core_snps():
+    # TPMT *3B + *3C unphased: *3A/*1 and *3B/*3C both fit, flagged ambiguous
+    observations = [
+        VariantObservation(("6", 18138997, "C", "T"), "*3B", 1, False),
+        VariantObservation(("6", 18130687, "T", "C"), "*3C", 1, False),
+    ]
+    call = call_diplotype("TPMT", observations)
+    assert call.alleles == ["*3A", "*1"]
+    assert call.ambiguous
+
+def test_adhoc_tables_cached():
+    first = haplotypes_for({"*4": [("22", 1, "C", "T")], "*10": [("22", 2, "G", "A")]})
+    again = haplotypes_for({"*10": [("22", 2, "G", "A")], "*4": [("22", 1, "C", "T")]})
+    assert first is again
+
+def test_no_observations_is_reference():
+    assert call_diplotype("TPMT", []).alleles == ["*1", "*1"]
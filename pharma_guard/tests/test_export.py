@@ -0,0 +1,66 @@
+import sys
+import os
+import json
+import threading
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.export import ndjson_lines, fhir_ndjson_lines, json_array_chunks
+from pharma_guard.core.result_store import ResultStore
+
+def test_store_resume_from_cursor(tmp_path, make_response):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    cursors = [store.add(make_response(f"P{i}", "Warfarin")) for i in range(5)]
+    assert store.last_cursor() == cursors[-1]
+
+    lines = list(ndjson_lines(store.iter_results(after=cursors[1], batch_size=2)))
+    records = [json.loads(line) for line in lines]
+    assert [r["patient_id"] for r in records] == ["P2", "P3", "P4"]
+    assert records[0]["export_cursor"] == cursors[2]
+
+    assert len(list(store.iter_results(limit=2))) == 2
+
+def test_iter_results_resumed_on_another_thread(tmp_path, make_response):
+    # StreamingResponse may advance the generator from a different threadpool thread per batch
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    for i in range(7):
+        store.add(make_response(f"P{i}", "Warfarin"))
+
+    rows = store.iter_results(batch_size=3)
+    seen = [next(rows)[1]["patient_id"]]
+    def drain():
+        seen.extend(record["patient_id"] for _, record in rows)
+    worker = threading.Thread(target=drain)
+    worker.start()
+    worker.join()
+    assert seen == [f"P{i}" for i in range(7)]
+
+def test_fhir_mapping(make_response):
+    record = make_response("P1", "Warfarin").model_dump()
+    observation, report = [json.loads(line) for line in fhir_ndjson_lines([(7, record)])]
+
+    assert observation["resourceType"] == "Observation"
+    assert observation["subject"] == {"reference": "Patient/P1"}
+    assert observation["valueCodeableConcept"]["text"] == "PM"
+    assert report["resourceType"] == "DiagnosticReport"
+    assert report["id"] == "pharmaguard-7-warfarin"
+    assert report["result"] == [{"reference": f"Observation/{observation['id']}"}]
+    assert report["conclusion"].startswith("Warfarin: Toxic (severity high).")
+
+def test_json_array_chunks_matches_json_dumps():
+    records = [{"a": 1}, {"b": [1, 2]}]
+    assert "".join(json_array_chunks(iter(records))) == json.dumps(records, indent=2) + "\n"
+    assert json.loads("".join(json_array_chunks(iter([])))) == []
+
+def test_store_private_and_pruned(tmp_path, make_response):
+    path = tmp_path / "private" / "results.sqlite3"
+    store = ResultStore(path=str(path), retention=3600)
+    old = store.add(make_response("P1", "Warfarin"))
+    store._conn().execute("UPDATE results SET created = created - 7200 WHERE id = ?", (old,))
+    recent = store.add(make_response("P2", "Warfarin"))
+    assert (path.stat().st_mode & 0o777) == 0o600
+    assert (path.parent.stat().st_mode & 0o777) == 0o700
+
+    assert store.prune() == 1
+    assert [cursor for cursor, _ in store.iter_results()] == [recent]
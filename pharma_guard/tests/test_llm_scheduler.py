@@ -0,0 +1,87 @@
+import sys
+import os
+import threading
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import pytest
+
+from pharma_guard.core.llm_scheduler import LLMScheduler, LLMOverloaded, Priority, parse_reset
+
+class FakeRaw:
+    def __init__(self, headers, value="ok"):
+        self.headers = headers
+        self.value = value
+
+    def parse(self):
+        return self.value
+
+def test_parse_reset():
+    assert parse_reset("2m59.56s") == pytest.approx(179.56)
+    assert parse_reset("7.66s") == pytest.approx(7.66)
+    assert parse_reset("120ms") == pytest.approx(0.12)
+    assert parse_reset("3") == 3.0
+    assert parse_reset(None) is None
+
+def test_batch_shed_when_budget_reserved():
+    scheduler = LLMScheduler(max_concurrent=2, batch_reserve=0.2,
+                             max_wait={Priority.INTERACTIVE: 1.0, Priority.BATCH: 0.05})
+    headers = {
+        "x-ratelimit-limit-requests": "100",
+        "x-ratelimit-remaining-requests": "10",  # Below the 20% batch reserve
+        "x-ratelimit-reset-requests": "30s",
+    }
+    assert scheduler.run(lambda: FakeRaw(headers)) == "ok"
+
+    # Interactive may dip into the reserve, batch is shed before a 429
+    assert scheduler.run(lambda: FakeRaw(headers), priority=Priority.INTERACTIVE) == "ok"
+    with pytest.raises(LLMOverloaded):
+        scheduler.run(lambda: FakeRaw(headers), priority=Priority.BATCH)
+
+    metrics = scheduler.metrics()
+    assert metrics["shed"] == 1
+    assert metrics["admitted"] == 2
+    assert metrics["queue_depth"] == 0
+
+def test_interactive_admitted_before_batch():
+    scheduler = LLMScheduler(max_concurrent=1, max_wait={Priority.INTERACTIVE: 5.0, Priority.BATCH: 5.0})
+    release = threading.Event()
+    order = []
+
+    blocker = threading.Thread(target=scheduler.run, args=(lambda: release.wait() and FakeRaw({}),))
+    blocker.start()
+    time.sleep(0.05)
+
+    def submit(name, priority):
+        scheduler.run(lambda: order.append(name) or FakeRaw({}), priority=priority)
+
+    batch = threading.Thread(target=submit, args=("batch", Priority.BATCH))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=submit, args=("interactive", Priority.INTERACTIVE))
+    interactive.start()
+    time.sleep(0.05)
+    assert scheduler.metrics()["queue_depth"] == 2
+
+    release.set()
+    for t in (blocker, batch, interactive):
+        t.join(timeout=5)
+    assert order == ["interactive", "batch"]
+
+def test_budget_split_between_workers():
+    scheduler = LLMScheduler(max_concurrent=4, max_wait={Priority.INTERACTIVE: 0.05, Priority.BATCH: 0.05})
+    scheduler.set_worker_count(4)
+    headers = {
+        "x-ratelimit-limit-requests": "100",
+        "x-ratelimit-remaining-requests": "8",  # Account-wide; this worker's slice is 2
+        "x-ratelimit-reset-requests": "30s",
+    }
+    scheduler.run(lambda: FakeRaw(headers))
+    assert scheduler.metrics()["remaining_requests"] == 2
+
+    scheduler.run(lambda: FakeRaw({}))
+    scheduler.run(lambda: FakeRaw({}))
+    with pytest.raises(LLMOverloaded):
+        scheduler.run(lambda: FakeRaw({}))
@@ -0,0 +1,118 @@
+import sys
+import os
+import copy
+import json
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core import cpic_logic
+from pharma_guard.core.cpic_logic import rule_snapshot, rules_version
+from pharma_guard.core.reanalysis import diff_rules, is_affected, reanalyze
+from pharma_guard.core.result_store import ResultStore
+
+def test_diff_rules():
+    old = rule_snapshot()
+    new = copy.deepcopy(old)
+    new["activity"]["CYP2D6"]["*10"] = 0.25
+    new["drugs"]["CODEINE"]["mapping"]["IM"] = ["Toxic", "high"]
+
+    changes = diff_rules(old, new)
+    assert changes["alleles"] == {"CYP2D6": ["*10"]}
+    assert changes["drugs"] == {"CODEINE": ["IM"]}
+    assert not changes["risk_logic"]
+
+    assert is_affected(changes, "Codeine", "CYP2D6", ["*1", "*10"], "NM")
+    assert is_affected(changes, "codeine", "CYP2D6", ["*1", "*4"], "IM")
+    assert not is_affected(changes, "Codeine", "CYP2D6", ["*1", "*4"], "NM")
+    assert not is_affected(changes, "Warfarin", "CYP2C9", ["*3", "*3"], "PM")
+
+def test_threshold_change_seen_from_rule_data(monkeypatch):
+    old = rule_snapshot()
+    assert old["phenotype_logic"]["CYP2D6"]["*4/*4"] == "PM"
+    assert rules_version(rule_snapshot()) == rules_version(old)
+
+    # A threshold edit inside a phenotype function shows up as a changed table
+    monkeypatch.setitem(cpic_logic.PHENOTYPE_FUNCTIONS, "CYP2D6",
+                        lambda alleles: cpic_logic.Phenotype.IM if "*4" in alleles else cpic_logic.Phenotype.NM)
+    new = rule_snapshot()
+    assert rules_version(new) != rules_version(old)
+    assert diff_rules(old, new)["phenotype_logic"] == ["CYP2D6"]
+
+def test_reanalyze_only_affected(tmp_path, make_response):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    stale = store.add(make_response("P1", "Warfarin"))      # CYP2C9 *3/*3 stored as PM/Toxic
+    untouched = store.add(make_response("P2", "Warfarin"))
+
+    # Pretend P1 was computed under rules where PM warfarin was "Adjust Dosage"
+    old = rule_snapshot()
+    # Warfarin is CYP2C9 + VKORC1 + CYP4F2; the stored result only has CYP2C9
+    old["drugs"]["WARFARIN"]["mapping"]["PM|Unknown|Unknown"] = ["Adjust Dosage", "moderate"]
+    store._conn().execute(
+        "INSERT INTO rule_snapshots (version, snapshot, created) VALUES ('old', ?, 0)", (json.dumps(old),)
+    )
+    record = dict(store.iter_results(after=stale - 1, limit=1))[stale]
+    record["risk_assessment"].update(risk_label="Adjust Dosage", severity="moderate")
+    store.update(stale, "old", record)
+
+    report = reanalyze(store)
+    assert report["scanned"] == 1
+    assert report["recomputed"] == 1
+    assert [c["export_cursor"] for c in report["changed"]] == [stale]
+    assert report["changed"][0]["new"]["risk_label"] == "Toxic"
+    assert report["rule_changes"]["old"]["drugs"] == {"WARFARIN": ["PM|Unknown|Unknown"]}
+
+    stored = dict(store.iter_results())
+    assert stored[stale]["risk_assessment"]["risk_label"] == "Toxic"
+    assert stored[untouched]["risk_assessment"]["risk_label"] == "Toxic"
+
+    # Everything is now current
+    assert reanalyze(store)["scanned"] == 0
+
+def test_reanalyze_in_pages(tmp_path, make_response):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    cursors = [store.add(make_response(f"P{i}", "Warfarin")) for i in range(3)]
+    store._conn().execute("UPDATE results SET rules_version = NULL")
+
+    first = reanalyze(store, limit=2)
+    assert first["scanned"] == 2
+    assert first["next_cursor"] == cursors[1]
+
+    second = reanalyze(store, after=first["next_cursor"], limit=2)
+    assert second["scanned"] == 1
+    assert second["next_cursor"] is None
+    assert reanalyze(store)["scanned"] == 0
+
+def _tag_with_old_rules(store, cursor, old_snapshot, record=None):
+    store._conn().execute(
+        "INSERT OR IGNORE INTO rule_snapshots (version, snapshot, created) VALUES ('old', ?, 0)",
+        (json.dumps(old_snapshot),)
+    )
+    store.update(cursor, "old", record)
+
+def test_confidence_change_is_written(tmp_path, make_response):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    cursor = store.add(make_response("P1", "Warfarin"))  # PM/Toxic at confidence 0.95
+    old = rule_snapshot()
+    old["risk_logic"] = "0"  # e.g. confidence handling changed since
+    _tag_with_old_rules(store, cursor, old)
+
+    report = reanalyze(store)
+    assert report["recomputed"] == 1
+    # Same call, but without VKORC1/CYP4F2 the current rules give 0.8
+    assert report["changed"][0]["old"]["confidence_score"] == 0.95
+    assert report["changed"][0]["new"]["confidence_score"] == 0.8
+    assert dict(store.iter_results())[cursor]["risk_assessment"]["confidence_score"] == 0.8
+
+def test_unrecomputable_result_not_rescanned(tmp_path, make_response):
+    store = ResultStore(path=str(tmp_path / "results.sqlite3"))
+    cursor = store.add(make_response("P1", "Warfarin"))
+    record = dict(store.iter_results())[cursor]
+    record["pharmacogenomic_profile"]["primary_gene"] = "CYP2D6"  # Stored before warfarin moved to CYP2C9
+    old = rule_snapshot()
+    old["risk_logic"] = "0"
+    _tag_with_old_rules(store, cursor, old, record)
+
+    assert [s["export_cursor"] for s in reanalyze(store)["skipped"]] == [cursor]
+    assert reanalyze(store)["scanned"] == 0
+    assert [r["export_cursor"] for r in store.needs_reparse()] == [cursor]
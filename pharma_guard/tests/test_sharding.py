@@ -0,0 +1,75 @@
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import pytest
+
+from pharma_guard.core.sharding import (
+    ShardLedger, run_shards, iter_run_output, read_shard_entries, shard_marker_path, shard_output_path
+)
+
+VCF = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'TC_P1_PATIENT_001_Normal.vcf'))
+
+def _manifest(tmp_path, n):
+    path = tmp_path / "manifest.tsv"
+    lines = ["# cohort", ""] + [f"P{i}\t{VCF}" for i in range(1, n + 1)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+def test_plan_and_seek(tmp_path):
+    manifest = _manifest(tmp_path, 5)
+    ledger = ShardLedger(str(tmp_path / "run"))
+    assert ledger.plan(manifest, 2) == 3
+    assert ledger.plan(manifest, 2) == 3  # Idempotent for the same run
+    with pytest.raises(ValueError):
+        ledger.plan(manifest, 4)
+
+    shard = ledger.claim("w1", 60)
+    assert shard["shard"] == 0 and shard["start_index"] == 0
+    second = ledger.claim("w2", 60)
+    assert [p for p, _ in read_shard_entries(manifest, second["start_offset"], second["size"])] == ["P3", "P4"]
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    manifest = _manifest(tmp_path, 2)
+    ledger = ShardLedger(str(tmp_path / "run"))
+    ledger.plan(manifest, 2)
+    assert ledger.claim("dead-worker", -1)["shard"] == 0  # Lease already expired
+    assert ledger.claim("w2", 60)["shard"] == 0
+    assert not ledger.renew(0, "dead-worker", 60)
+    # The stale worker can't complete the shard under the new owner
+    assert not ledger.complete(0, "dead-worker")
+    assert ledger.progress()["running"] == 1
+    assert ledger.complete(0, "w2")
+
+def test_restart_skips_committed_shards(tmp_path, stub_llm):
+    manifest = _manifest(tmp_path, 5)
+    run_dir = str(tmp_path / "run")
+
+    first = run_shards(run_dir, manifest, ["Codeine"], stub_llm, shard_size=2, max_shards=1)
+    assert first["shards"] == [0] and first["progress"]["pending"] == 2
+
+    # Worker died mid-shard 1: partial output, no marker, lease expired
+    ShardLedger(run_dir).claim("dead-worker", -1)
+    with open(shard_output_path(run_dir, 1), "w") as f:
+        f.write("partial")
+
+    second = run_shards(run_dir, manifest, ["Codeine"], stub_llm, shard_size=2)
+    assert second["shards"] == [1, 2] and second["progress"]["done"] == 3
+
+    records = [json.loads(line) for line in iter_run_output(run_dir)]
+    assert [r["export_cursor"] for r in records] == [1, 2, 3, 4, 5]
+    assert records[2]["patient_id"] == "P3"
+    assert json.load(open(shard_marker_path(run_dir, 2)))["patients"] == 1
+
+    assert run_shards(run_dir, manifest, ["Codeine"], stub_llm, shard_size=2)["shards"] == []
+
+def test_missing_vcf_recorded_not_fatal(tmp_path, stub_llm):
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text(f"P1\t{VCF}\nP2\t/does/not/exist.vcf\n")
+    report = run_shards(str(tmp_path / "run"), str(manifest), ["Codeine"], stub_llm, shard_size=10)
+    assert report["patients"] == 2 and report["errors"] == 1
+    lines = [json.loads(line) for line in iter_run_output(str(tmp_path / "run"))]
+    assert "error" in lines[1] and lines[1]["export_cursor"] == 2
@@ -0,0 +1,102 @@
+import sys
+import os
+import threading
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.single_flight import SingleFlight
+
+def _run_concurrently(flights, key, fn, n=5):
+    results, errors = [], []
+    def worker():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads: t.start()
+    return threads, results, errors
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"answer": 42}
+
+    threads, results, errors = _run_concurrently(flights, "k", slow)
+    while flights.metrics()["shared"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads: t.join()
+
+    assert len(calls) == 1 and not errors
+    assert len(results) == 5 and all(r is results[0] for r in results)
+    assert flights.metrics() == {"in_flight": 0, "executed": 1, "shared": 4}
+
+    # Completed calls are not remembered
+    assert flights.do("k", lambda: "again") == "again"
+
+def test_error_is_shared():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, results, errors = _run_concurrently(flights, "k", failing, n=3)
+    while flights.metrics()["shared"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads: t.join()
+    assert not results and len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+def test_distinct_keys_run_separately():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == 1
+    assert flights.do("b", lambda: 2) == 2
+    assert flights.metrics()["executed"] == 2
+
+def test_interactive_call_not_joined_to_shed_batch_leader(monkeypatch):
+    from types import SimpleNamespace
+    from pharma_guard.core import llm_service
+    from pharma_guard.core.llm_scheduler import LLMOverloaded, Priority
+
+    release = threading.Event()
+
+    def run(call, priority, estimated_tokens):
+        if priority == Priority.BATCH:
+            release.wait(5)
+            raise LLMOverloaded("batch work shed")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))])
+
+    monkeypatch.setattr(llm_service, "get_shared_cache", lambda: None)
+    monkeypatch.setattr(llm_service.llm_scheduler, "run", run)
+
+    def service(priority):
+        svc = llm_service.LLMService(api_key="", priority=priority)
+        svc.client, svc.model_name = object(), "test-model"
+        return svc
+
+    errors = []
+    def batch():
+        try:
+            service(Priority.BATCH)._complete("same prompt")
+        except LLMOverloaded as e:
+            errors.append(e)
+    leader = threading.Thread(target=batch)
+    leader.start()
+    while llm_service.llm_flights.metrics()["in_flight"] < 1:
+        time.sleep(0.001)
+
+    # Same prompt while the batch leader is queued: runs its own interactive call
+    assert service(Priority.INTERACTIVE)._complete("same prompt") == "{}"
+    release.set()
+    leader.join()
+    assert len(errors) == 1
@@ -0,0 +1,146 @@
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from pharma_guard.core.vcf_parser import VCFParser
+from pharma_guard.core.cpic_logic import calculate_phenotypes, evaluate_panel
+from pharma_guard.core.star_annotation import StarAlleleIndex, get_default_index
+from pharma_guard.models.schemas import Phenotype
+from pharma_guard.core.variants import DetectionTable
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+def _write_vcf(tmp_path, rows):
+    path = tmp_path / "raw.vcf"
+    path.write_text(HEADER + "".join("\t".join(r) + "\n" for r in rows))
+    return str(path)
+
+def test_index_lookup():
+    index = get_default_index()
+    assert index.lookup("chr22", 42128945, "C", "T") == ("CYP2D6", "*4")
+    # Contig naming and multi-allelic ALT
+    assert index.lookup("22", 42128945, "C", "G,T") == ("CYP2D6", "*4")
+    assert index.lookup("chr22", 42128945, "C", "G") is None
+
+def test_builtin_table_known_rsids():
+    index = get_default_index()
+    assert index.version
+    known = {
+        "rs3892097": ("CYP2D6", "*4"), "rs1065852": ("CYP2D6", "*10"), "rs16947": ("CYP2D6", "*2"),
+        "rs28371725": ("CYP2D6", "*41"), "rs4244285": ("CYP2C19", "*2"), "rs4986893": ("CYP2C19", "*3"),
+        "rs12248560": ("CYP2C19", "*17"), "rs1799853": ("CYP2C9", "*2"), "rs1057910": ("CYP2C9", "*3"),
+        "rs4149056": ("SLCO1B1", "*5"), "rs1800462": ("TPMT", "*2"), "rs1800460": ("TPMT", "*3B"),
+        "rs1142345": ("TPMT", "*3C"), "rs3918290": ("DPYD", "*2A"), "rs55886062": ("DPYD", "*13"),
+        "rs9923231": ("VKORC1", "*2"), "rs2108622": ("CYP4F2", "*3"),
+    }
+    for rsid, call in known.items():
+        assert index.rsids[rsid] == call, rsid
+    # One build only: no GRCh37 CYP2D6 coordinates (42.52 Mb)
+    assert index.lookup("22", 42524947, "C", "T") is None
+
+    definitions = index.definitions()
+    assert len(definitions["TPMT"]["*3A"]) == 2
+    assert len(definitions["CYP2D6"]["*4"]) == 2
+
+def test_raw_sample_vcf_homozygous_cyp2d6_star4(tmp_path):
+    # Same record as the repo's raw sample.vcf: rs3892097 1/1 is CYP2D6 *4/*4
+    path = tmp_path / "raw.vcf"
+    path.write_text(
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n"
+        "22\t42128945\trs3892097\tC\tT\t.\tPASS\t.\tGT\t1/1\n"
+    )
+    genotypes = VCFParser(str(path))._parse_simple()
+    assert genotypes["CYP2D6"] == ["*4", "*4"]
+    assert calculate_phenotypes(genotypes)["CYP2D6"] == Phenotype.PM
+
+def test_raw_vcf_annotated_by_position(tmp_path):
+    path = _write_vcf(tmp_path, [
+        ["chr10", "94781859", "rs4244285", "G", "A", "99", "PASS", "."],
+        ["chr10", "94761900", ".", "C", "T", "99", "PASS", "DP=40"],
+        ["chr10", "12345", ".", "A", "G", "99", "PASS", "."],
+    ])
+    parser = VCFParser(path)
+    genotypes = parser._parse_simple()
+    assert genotypes["CYP2C19"] == ["*17", "*2"]
+    assert parser.quality_metrics.gene_detected
+
+    detections = parser.get_detection_table()
+    assert list(detections) == [("rs4244285", "*2"), (".", "*17")]
+    assert [d.star_allele for d in parser.get_detections()] == ["*2", "*17"]
+
+def test_custom_table(tmp_path):
+    table = tmp_path / "table.tsv"
+    table.write_text("#CHROM\tPOS\tREF\tALT\tGENE\tSTAR\n1\t100\tA\tC\tDPYD\t*2A\n")
+    path = _write_vcf(tmp_path, [["chr1", "100", ".", "A", "C", "50", "PASS", "."]])
+    parser = VCFParser(path, annotation_index=StarAlleleIndex.from_table(str(table)))
+    assert parser._parse_simple()["DPYD"] == ["*2A", "*1"]
+
+def test_reference_genotypes_not_called(tmp_path):
+    path = tmp_path / "gt.vcf"
+    path.write_text(
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+        "chr6\t18133885\t.\tG\tA\t99\tPASS\tGENE=TPMT;STAR=*3A\tGT:DP\t0/0:40\n"
+        "chr6\t18143724\t.\tT\tC\t99\tPASS\tGENE=TPMT;STAR=*3B\tGT:DP\t1/1:40\n"
+    )
+    parser = VCFParser(str(path))
+    assert parser._parse_simple()["TPMT"] == ["*3B", "*3B"]
+    assert not parser.diplotype_calls["TPMT"].ambiguous
+    # The 0/0 *3A site is not a detected variant
+    assert list(parser.get_detection_table()) == [(".", "*3B")]
+
+def test_multiallelic_per_allele(tmp_path):
+    path = tmp_path / "multi.vcf"
+    path.write_text(
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+        # G is not a star-defining ALT: 0/1 is only a call of that allele
+        "chr22\t42128945\trs3892097\tC\tG,T\t99\tPASS\t.\tGT\t0/1\n"
+        "chr10\t94781859\trs4244285\tG\tC,A\t99\tPASS\t.\tGT\t1/2\n"
+    )
+    parser = VCFParser(str(path))
+    genotypes = parser._parse_simple()
+    assert genotypes["CYP2D6"] == ["*1", "*1"]
+    assert genotypes["CYP2C19"] == ["*2", "*1"]
+    assert list(parser.get_detection_table()) == [("rs4244285", "*2")]
+
+def test_uncovered_genes_not_called(tmp_path):
+    # CYP2C9-only VCF: no record near VKORC1/CYP4F2, so they are not assumed *1/*1
+    path = _write_vcf(tmp_path, [["chr10", "94981296", "rs1057910", "A", "C", "99", "PASS", "."]])
+    genotypes = VCFParser(path)._parse_simple()
+    assert set(genotypes) == {"CYP2C9"}
+
+    phenotypes = calculate_phenotypes(genotypes)
+    calls = evaluate_panel(phenotypes)
+    assert set(calls) == {"WARFARIN"}  # Only drugs of called genes are touched
+    assert calls["WARFARIN"].confidence == 0.8  # Secondary genes missing
+
+def test_streaming_qc(tmp_path):
+    path = tmp_path / "qc.vcf"
+    path.write_text(
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+        "chr10\t94781859\trs4244285\tG\tA\t99\tPASS\t.\tGT:DP:GQ\t0/1:12:35\n"
+        "chr10\t94761900\t.\tC\tT\t99\tLowQual\t.\tGT:DP:GQ\t./.:45:99\n"
+        "chr1\t12345\t.\tA\tG\t99\t.\tDP=80\tGT\t0/1\n"
+    )
+    parser = VCFParser(str(path))
+    parser._parse_simple()
+    qc = parser.quality_metrics
+    assert (qc.total_records, qc.filter_pass, qc.filter_fail) == (3, 2, 1)
+    assert qc.filter_counts == {"PASS": 1, "LowQual": 1, ".": 1}
+    assert qc.depth.count == 3 and qc.depth.min == 12 and qc.depth.max == 80
+    assert qc.genotype_quality.histogram == {"30-59": 1, "99+": 1}
+    assert qc.gene_qc["CYP2C19"].sites == 2 and qc.gene_qc["CYP2C19"].call_rate == 0.5
+    assert [(s.rsid, s.depth) for s in qc.low_coverage_sites] == [("rs4244285", 12)]
+
+def test_detection_table():
+    table = DetectionTable()
+    table.append("rs1", "".join(["*", "4"]))
+    table.append("rs2", "".join(["*", "4"]))
+    assert table.stars[0] is table.stars[1]  # interned
+
+    models = table.to_models()
+    assert [(m.rsid, m.star_allele) for m in models] == [("rs1", "*4"), ("rs2", "*4")]
+    assert table.to_models() is models  # built once, shared across drugs
+    assert list(DetectionTable.from_columns(json.loads(json.dumps(table.to_columns())))) == list(table)
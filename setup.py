@@ -4,4 +4,14 @@ setup(
     name="pharma_guard",
     version="1.0.0",
     packages=find_packages(),
+    package_data={"pharma_guard": ["data/*.tsv"]},
+    extras_require={
+        # Parquet / Arrow output (cli.py --format parquet|arrow, /api/export)
+        "columnar": ["pyarrow>=14.0.0"],
+    },
+    entry_points={
+        "console_scripts": [
+            "pharma-guard-server=pharma_guard.server:main",
+        ],
+    },
 )
@@ -1,3 +1,3 @@
 #!/bin/bash
 pip install -r requirements.txt
-uvicorn backend.main:app --host 0.0.0.0 --port $PORT
+python -m pharma_guard.server --host 0.0.0.0 --port $PORT